@@ -1,16 +1,22 @@
 import streamlit as st
-import pandas as pd
 import numpy as np
-import plotly.express as px
+import pandas as pd
 import plotly.graph_objects as go
-from plotly.subplots import make_subplots
-import requests
-import json
-import time
 from datetime import datetime
-import base64
+import os
+from pathlib import Path
 import random
-import math
+import re
+import threading
+
+from matai.agent import EnhancedMaterialAI
+from matai.history import ChatHistoryStore, ChatSession
+from matai.metrics import MetricsFeed, open_metrics_source
+from matai.phases import load_phase_index
+from matai.plots import FIGURE_THEME, FigureCache, create_usp_simulation_plot, create_xrd_comparison_plot
+from matai.profiling import RerunProfiler
+from matai.usp import USPSimulator
+from matai.xrd import LatticeRefiner, XRDAnalyzer, XRDSampleIndex, XRDScanStore, decimate_trace, read_xrd_table
 
 # Page Configuration
 st.set_page_config(
@@ -90,315 +96,168 @@ def load_css():
     </style>
     """, unsafe_allow_html=True)
 
-# Enhanced AI System with Think Tank & Real-time Knowledge
-class EnhancedMaterialAI:
-    def __init__(self):
-        self.chat_history = []
-        self.knowledge_base = self._init_knowledge_base()
-        
-    def _init_knowledge_base(self):
-        """Initialize with real-time materials science knowledge"""
-        return {
-            "recent_discoveries": [
-                "2024: Revolutionary quantum dots for solar cells achieve 47% efficiency",
-                "2024: AI-designed perovskite materials show 10x stability improvement",
-                "2023: Machine learning accelerates battery material discovery by 200%",
-                "2023: Novel 2D materials enable flexible electronics breakthrough"
-            ],
-            "usp_parameters": {
-                "temperature_range": "400-500°C",
-                "frequency": "1.6-2.0 MHz",
-                "deposition_time": "10-30 minutes",
-                "substrate_materials": ["Silicon", "Glass", "ITO", "Flexible polymer"]
-            },
-            "market_trends": {
-                "transparent_electronics": "$15.2B by 2028",
-                "quantum_dots": "25% CAGR",
-                "flexible_displays": "$8.9B market",
-                "energy_storage": "Fastest growing segment"
-            }
-        }
-    
-    def get_realtime_insights(self, query="materials science breakthroughs"):
-        """Simulate real-time knowledge retrieval"""
-        insights = [
-            f"🔥 Breaking: New {random.choice(['ZnO', 'perovskite', 'graphene', 'quantum dot'])} research shows {random.randint(20,80)}% efficiency boost",
-            f"📈 Market Alert: {random.choice(['Solar cells', 'LED displays', 'Sensors', 'Batteries'])} sector growing {random.randint(15,35)}% annually",
-            f"🧪 Lab Update: AI-optimized synthesis reduces costs by {random.randint(30,70)}%",
-            f"🚀 Innovation: {random.choice(['MIT', 'Stanford', 'NREL', 'Tokyo Tech'])} develops next-gen materials platform"
-        ]
-        return random.choice(insights)
-    
-    def think_tank_response(self, question):
-        """AI Think Tank with reasoning process"""
-        thinking_steps = [
-            "🤔 Analyzing your question from multiple scientific perspectives...",
-            "🔍 Cross-referencing with latest research databases...",
-            "⚡ Connecting materials properties with real-world applications...",
-            "💡 Formulating comprehensive response..."
-        ]
-        
-        # Show thinking process
-        for step in thinking_steps:
-            time.sleep(0.5)
-        
-        if "ZnO" in question or "zinc oxide" in question.lower():
-            return self._zno_expert_response(question)
-        elif "USP" in question or "spray pyrolysis" in question.lower():
-            return self._usp_expert_response(question)
-        elif "market" in question.lower() or "business" in question.lower():
-            return self._market_expert_response(question)
-        else:
-            return self._general_expert_response(question)
-    
-    def _zno_expert_response(self, question):
-        return """
-        🔬 **ZnO Materials Expert Analysis:**
-        
-        **Key Insights:**
-        • ZnO is a wide bandgap semiconductor (3.37 eV) ideal for UV applications
-        • Mg doping creates quantum confinement effects, tuning optical properties
-        • Wurtzite crystal structure provides excellent mechanical stability
-        
-        **Real-world Applications:**
-        • Smartphone screens (transparent conductors)
-        • Solar panels (anti-reflective coatings)
-        • Medical devices (antibacterial surfaces)
-        
-        **Market Potential:** $2.8B by 2027 (CAGR: 6.2%)
-        
-        **Optimization Tips:**
-        • Use 0.05-0.10 mol Mg for optimal transparency
-        • 450°C deposition temperature balances quality and efficiency
-        • Post-annealing improves crystallinity by 40%
-        """
-    
-    def _usp_expert_response(self, question):
-        return """
-        🌊 **Ultrasonic Spray Pyrolysis Expert:**
-        
-        **Process Advantages:**
-        • Uniform film thickness (±5% variation)
-        • Scalable from lab to industrial production
-        • Low-cost equipment and materials
-        
-        **Key Parameters:**
-        • Frequency: 1.7 MHz (optimal droplet size)
-        • Temperature: 450°C (complete decomposition)
-        • Carrier gas: Air or N₂ (controls atmosphere)
-        
-        **Quality Factors:**
-        • Substrate preheating: Improves adhesion 3x
-        • Solution concentration: 0.1-0.3 M optimal
-        • Spray rate: 2-5 ml/min for uniform coating
-        
-        **Industrial Applications:** Display manufacturing, solar cell production, sensor fabrication
-        """
-    
-    def _market_expert_response(self, question):
-        return """
-        📊 **Market Intelligence Analysis:**
-        
-        **Current Trends:**
-        • AI-driven materials discovery: $1.2B investment in 2024
-        • Sustainable manufacturing: 45% industry priority
-        • Flexible electronics: Fastest growing segment
-        
-        **Business Opportunities:**
-        • SaaS Analytics Platform: $500K-2M ARR potential
-        • Custom AI Solutions: $50K-500K per project
-        • Data Licensing: $10K-100K per dataset
-        
-        **Competitive Advantage:**
-        • 10x faster R&D cycles with AI automation
-        • 60% cost reduction in materials testing
-        • Real-time optimization capabilities
-        
-        **Investment Climate:** VCs investing $3.2B in materials tech (2024)
-        """
-    
-    def _general_expert_response(self, question):
-        return f"""
-        🧠 **AI Think Tank Collective Response:**
-        
-        **Multi-disciplinary Analysis:**
-        Based on your question about "{question[:50]}...", our AI experts suggest:
-        
-        **Scientific Perspective:**
-        • Latest research indicates promising developments in this area
-        • Cross-material comparisons show significant potential
-        • Experimental validation recommended for optimization
-        
-        **Technical Implementation:**
-        • Scalable synthesis methods available
-        • Quality control protocols well-established
-        • Cost-effective production pathways identified
-        
-        **Market Validation:**
-        • Strong industry demand signals
-        • Multiple application opportunities
-        • Favorable investment climate
-        
-        **Next Steps:** Would you like me to dive deeper into any specific aspect?
-        """
-
-# USP Simulation Engine
-class USPSimulator:
-    def __init__(self):
-        self.default_params = {
-            "temperature": 450,  # Celsius
-            "frequency": 1.7,    # MHz
-            "time": 15,          # minutes
-            "concentration": 0.1, # mol/L
-            "flow_rate": 3       # ml/min
-        }
-    
-    def simulate_deposition(self, params=None):
-        """Simulate USP deposition process"""
-        if params is None:
-            params = self.default_params
-        
-        # Generate realistic simulation data
-        time_points = np.linspace(0, params["time"], 100)
-        
-        # Film thickness growth (non-linear)
-        thickness = 50 * (1 - np.exp(-time_points/5)) * (params["temperature"]/450)
-        
-        # Crystallinity development
-        crystallinity = 30 + 40 * (1 - np.exp(-time_points/8)) * (params["frequency"]/1.7)
-        
-        # Surface roughness evolution
-        roughness = 5 + 3 * np.sin(time_points/2) * np.exp(-time_points/10)
-        
-        return {
-            "time": time_points,
-            "thickness": thickness,
-            "crystallinity": crystallinity,
-            "roughness": roughness,
-            "final_quality": self._calculate_quality_score(params)
-        }
-    
-    def _calculate_quality_score(self, params):
-        """Calculate overall film quality score (0-100)"""
-        temp_score = max(0, 100 - abs(params["temperature"] - 450) * 2)
-        freq_score = max(0, 100 - abs(params["frequency"] - 1.7) * 30)
-        time_score = min(100, params["time"] * 5)
-        conc_score = max(0, 100 - abs(params["concentration"] - 0.1) * 200)
-        
-        return (temp_score + freq_score + time_score + conc_score) / 4
+# Shared Engines
+@st.cache_resource
+def get_ai_agent():
+    """Process-wide Think Tank engine; per-session state lives in st.session_state"""
+    return EnhancedMaterialAI()
+
+@st.cache_resource
+def get_usp_simulator():
+    return USPSimulator()
 
 # Data Processing Functions
-@st.cache_data
-def load_xrd_data():
-    try:
-        df = pd.read_csv('dataset/xrd_zno_zno-mg.csv')
-        return df
-    except FileNotFoundError:
-        # Generate sample data if file not found
-        data = {
-            'Sample': ['ZnO']*13 + ['ZnO:Mg']*12,
-            'H': [1,0,1,1,1,1,2,1,2,0,2,1,2] + [1,0,1,1,1,1,2,1,2,0,2,1],
-            'K': [0,0,0,0,1,0,0,1,0,0,0,0,0] + [0,0,0,0,1,0,0,1,0,0,0,0],
-            'L': [0,2,1,2,0,3,0,2,1,4,2,4,3] + [0,2,1,2,0,3,0,2,1,4,2,4],
-            '2Theta': [31.77,34.43,36.27,47.58,56.65,62.93,66.45,68.03,69.17,72.67,77.07,81.51,89.77] + 
-                     [31.84,34.61,36.36,47.72,56.71,63.15,66.51,68.15,69.24,72.99,77.18,81.82],
-            'd_hkl': [2.809,2.599,2.472,1.908,1.622,1.475,1.405,1.376,1.356,1.299,1.236,1.179,1.091] + 
-                    [2.811,2.591,2.471,1.905,1.623,1.472,1.405,1.375,1.356,1.295,1.235,1.177],
-            'I': [267.1,881.4,937.5,250.1,106.5,233.7,52.81,173.9,87.51,60.31,55.08,63.01,76.41] + 
-                [155.9,1140,346.6,136.6,75.88,130.8,69.71,107.1,57.24,78.01,48.85,50.47]
-        }
-        return pd.DataFrame(data)
-
-def create_usp_simulation_plot(simulation_data):
-    """Create USP process simulation visualization"""
-    fig = make_subplots(
-        rows=2, cols=2,
-        subplot_titles=('Film Thickness Growth', 'Crystallinity Development', 
-                       'Surface Roughness', 'Process Parameters'),
-        specs=[[{"secondary_y": False}, {"secondary_y": False}],
-               [{"secondary_y": False}, {"type": "indicator"}]]
-    )
-    
-    # Thickness plot
-    fig.add_trace(
-        go.Scatter(x=simulation_data["time"], y=simulation_data["thickness"],
-                  mode='lines', name='Thickness (nm)', line=dict(color='cyan', width=3)),
-        row=1, col=1
-    )
-    
-    # Crystallinity plot
-    fig.add_trace(
-        go.Scatter(x=simulation_data["time"], y=simulation_data["crystallinity"],
-                  mode='lines', name='Crystallinity (%)', line=dict(color='magenta', width=3)),
-        row=1, col=2
-    )
-    
-    # Roughness plot
-    fig.add_trace(
-        go.Scatter(x=simulation_data["time"], y=simulation_data["roughness"],
-                  mode='lines', name='Roughness (nm)', line=dict(color='orange', width=3)),
-        row=2, col=1
-    )
-    
-    # Quality indicator
-    fig.add_trace(
-        go.Indicator(
-            mode="gauge+number+delta",
-            value=simulation_data["final_quality"],
-            domain={'x': [0, 1], 'y': [0, 1]},
-            title={'text': "Film Quality Score"},
-            delta={'reference': 80},
-            gauge={'axis': {'range': [None, 100]},
-                   'bar': {'color': "darkblue"},
-                   'steps': [{'range': [0, 50], 'color': "lightgray"},
-                            {'range': [50, 80], 'color': "gray"}],
-                   'threshold': {'line': {'color': "red", 'width': 4},
-                               'thickness': 0.75, 'value': 90}}),
-        row=2, col=2
-    )
-    
-    fig.update_layout(
-        height=600,
-        plot_bgcolor='rgba(0,0,0,0)',
-        paper_bgcolor='rgba(0,0,0,0)',
-        font=dict(color='white', family='Orbitron'),
-        showlegend=False
-    )
-    
-    return fig
+@st.cache_resource
+def get_xrd_index(path='dataset/xrd_zno_zno-mg.csv'):
+    """Process-wide sample index of the bundled dataset; never modified after loading"""
+    return XRDSampleIndex(read_xrd_table(path), analyzer=get_xrd_analyzer())
+
+def get_session_xrd_index():
+    """This session's uploaded and added samples, layered over the shared index"""
+    if "xrd_index" not in st.session_state:
+        st.session_state.xrd_index = XRDSampleIndex(base=get_xrd_index())
+    return st.session_state.xrd_index
+
+# Sessions may only ingest scan directories under this root into the shared store
+SCAN_DIR = os.environ.get("MATAI_SCAN_ROOT", "dataset/scans")
+SCAN_ROOT = Path(SCAN_DIR).resolve()
+
+@st.cache_resource
+def get_scan_store(cache_dir="dataset/.xrd_cache"):
+    return XRDScanStore(cache_dir)
+
+@st.cache_resource
+def get_xrd_analyzer():
+    return XRDAnalyzer()
+
+@st.cache_resource
+def get_phase_index():
+    """Reference pattern index, built on first use and memory-mapped afterwards"""
+    return load_phase_index(os.environ.get("MATAI_PHASE_LIBRARY", "dataset/phases"), "dataset/.phase_index")
 
+@st.cache_resource
+def get_figure_cache():
+    return FigureCache()
+
+@st.cache_resource
+def get_chat_store():
+    return ChatHistoryStore(os.environ.get("MATAI_CHAT_DB", "dataset/.chat_history.sqlite"))
+
+def get_chat_session():
+    """This session's chat window; the conversation id in ``?chat=`` survives reloads"""
+    if "chat_session" not in st.session_state:
+        store = get_chat_store()
+        conversation = st.query_params.get("chat") or store.new_conversation_id()
+        st.query_params["chat"] = conversation
+        st.session_state.chat_session = ChatSession(
+            store, conversation,
+            window=int(os.environ.get("MATAI_CHAT_WINDOW", 40)),
+            max_chars=int(os.environ.get("MATAI_CHAT_MAX_CHARS", 100_000)))
+    return st.session_state.chat_session
+
+CHAT_PAGE_SIZE = 20
+CHAT_GREETING = "👋 Hi! I'm your AI research assistant. Ask me anything about materials science, USP processes, or market trends!"
+
+CHAT_HELP = """
+🤖 **I can help you with:**
+
+• **Materials Analysis**: XRD patterns, crystal structures, doping effects
+• **Process Optimization**: USP parameters, synthesis conditions
+• **Market Intelligence**: Industry trends, business opportunities
+• **Technical Questions**: Properties, applications, characterization
+• **Research Guidance**: Experimental design, data interpretation
+
+Just ask me anything! I have access to real-time research data and expert knowledge.
+"""
+
+def load_earlier_chat():
+    st.session_state.chat_earlier = st.session_state.get("chat_earlier", 0) + CHAT_PAGE_SIZE
+
+def cached_figure(kind, builder, *inputs, theme=FIGURE_THEME):
+    """Return a Plotly spec for ``builder()``, reusing it while the inputs are unchanged"""
+    cache = get_figure_cache()
+    return cache.get_or_build(cache.make_key(kind, theme, *inputs), builder)
+
+DASHBOARD_METRICS = {
+    "global_research_activity": "🌍 Global Research Activity",
+    "ai_discoveries_today": "🤖 AI Discoveries Today",
+    "active_labs": "🔬 Active Labs",
+    "new_patents": "📋 New Patents"
+}
+DASHBOARD_REFRESH = float(os.environ.get("MATAI_METRICS_INTERVAL", 5))
+XRD_OVERLAY_MAX_POINTS = 4000  # per trace; raw scans added to the overlay are decimated to this
+
+@st.cache_resource
+def get_metrics_feed():
+    """One background producer per process; every session reads its latest snapshot"""
+    source = open_metrics_source(os.environ.get("MATAI_METRICS_SOURCE", "stub"))
+    return MetricsFeed(source, interval=DASHBOARD_REFRESH).start()
+
+def format_metric(value, signed=False):
+    pattern = "{:+,.0f}" if signed else "{:,.0f}"
+    if float(value) != round(float(value)):
+        pattern = "{:+,.2f}" if signed else "{:,.2f}"
+    return pattern.format(value)
+
+@st.fragment(run_every=DASHBOARD_REFRESH)
 def create_realtime_dashboard():
-    """Create real-time materials research dashboard"""
-    # Simulate real-time data
-    current_time = datetime.now()
-    
-    # Generate random but realistic metrics
-    metrics = {
-        "global_research_activity": random.randint(850, 1200),
-        "ai_discoveries_today": random.randint(15, 45),
-        "active_labs": random.randint(2500, 3500),
-        "new_patents": random.randint(25, 85)
-    }
-    
-    col1, col2, col3, col4 = st.columns(4)
-    
-    with col1:
-        st.metric("🌍 Global Research Activity", f"{metrics['global_research_activity']}", "+12%")
-    
-    with col2:
-        st.metric("🤖 AI Discoveries Today", f"{metrics['ai_discoveries_today']}", "+5")
-    
-    with col3:
-        st.metric("🔬 Active Labs", f"{metrics['active_labs']:,}", "+8%")
-    
-    with col4:
-        st.metric("📋 New Patents", f"{metrics['new_patents']}", "+3")
-    
+    """Real-time research dashboard, redrawn on its own timer from the shared metrics feed"""
+    profiler = get_profiler()
+    with profiler.section("dashboard"):
+        snapshot = get_metrics_feed().snapshot()
+        metrics = snapshot["metrics"]
+        names = [name for name in DASHBOARD_METRICS if name in metrics]
+        names += [name for name in metrics if name not in DASHBOARD_METRICS]
+        if not names:
+            st.info("Waiting for the first metrics update...")
+        for start in range(0, len(names), 4):
+            for column, name in zip(st.columns(4), names[start:start + 4]):
+                delta = snapshot["deltas"].get(name)
+                column.metric(DASHBOARD_METRICS.get(name, name), format_metric(metrics[name]),
+                              None if delta is None else format_metric(delta, signed=True))
+        if snapshot["updated"] is not None:
+            st.caption(f"Updated {datetime.fromtimestamp(snapshot['updated']).strftime('%H:%M:%S')}")
+        if snapshot["error"]:
+            st.warning(f"Metrics source unavailable; values are from the last good update ({snapshot['error']})")
     return metrics
 
+@st.cache_resource
+def get_profiler():
+    """Process-wide profiler; section timings are logged as JSON lines to stderr while enabled"""
+    return RerunProfiler(enabled=os.environ.get("MATAI_PROFILE", "0") == "1",
+                         track_alloc=os.environ.get("MATAI_PROFILE_ALLOC", "0") == "1").log_to_stderr()
+
+def render_debug_panel(profiler):
+    """Hidden debug panel, shown with the ``?debug=1`` query parameter"""
+    with st.sidebar.expander("🛠️ Rerun Profiler", expanded=True):
+        profiler.enabled = st.toggle("Profiling enabled", value=profiler.enabled)
+        summary = profiler.summary()
+        if summary:
+            st.dataframe(pd.DataFrame(summary).set_index("section").round(2), use_container_width=True)
+            st.code(profiler.prometheus_text(), language="text")
+        else:
+            st.caption("No samples yet — interact with the app to collect timings.")
+        if st.button("Reset profiler"):
+            profiler.reset()
+    
+    with st.sidebar.expander("🖼️ Figure Cache"):
+        figure_stats = get_figure_cache().snapshot()
+        st.write(f"**Entries:** {figure_stats['entries']} ({figure_stats['bytes'] / 1024:.0f} KiB)")
+        st.write(f"**Hits / misses:** {figure_stats['hits']} / {figure_stats['misses']}")
+        st.write(f"**Evictions:** {figure_stats['evictions']}")
+
 # Main Application
 def main():
-    load_css()
+    profiler = get_profiler()
+    with profiler.section("rerun.total"):
+        render_app(profiler)
+    
+    if st.query_params.get("debug") == "1":
+        render_debug_panel(profiler)
+
+def render_app(profiler):
+    with profiler.section("load_css"):
+        load_css()
     
     # Real-time status indicator
     st.markdown(f"""
@@ -412,8 +271,8 @@ def main():
     st.markdown('<p class="subtitle">🚀 Next-Gen Materials Discovery through AI Think Tank & Real-time Intelligence</p>', unsafe_allow_html=True)
     
     # Initialize systems
-    ai_agent = EnhancedMaterialAI()
-    usp_simulator = USPSimulator()
+    with profiler.section("engines.init"):
+        ai_agent = get_ai_agent()
     
     # Real-time dashboard
     st.markdown("## 📊 Real-time Research Intelligence")
@@ -423,75 +282,189 @@ def main():
     realtime_insight = ai_agent.get_realtime_insights()
     st.info(f"**Live Update:** {realtime_insight}")
     
-    # Main content tabs
-    tab1, tab2, tab3, tab4, tab5 = st.tabs(["🔬 XRD Analysis", "🤖 AI Think Tank", "🌊 USP Simulation", "💬 Chat Assistant", "📈 Market Intelligence"])
-    
-    with tab1:
+    # Tool navigation: only the active tool computes and renders, and each
+    # tool is a fragment so its own widgets rerun it in isolation
+    tool = st.radio("Tool", list(TOOLS), horizontal=True, label_visibility="collapsed",
+                    key="active_tool")
+    TOOLS[tool]()
+
+@st.fragment
+def render_xrd_tool():
+    """XRD pattern analysis, peak analysis and raw diffractogram runs"""
+    profiler = get_profiler()
+    with profiler.section("tab.xrd"):
         st.markdown("## 📈 Advanced XRD Pattern Analysis")
         
-        df = load_xrd_data()
+        with profiler.section("xrd.load"):
+            xrd_index = get_session_xrd_index()
         
         col1, col2 = st.columns([3, 1])
         
-        with col1:
-            # XRD visualization
-            fig = go.Figure()
+        with col1, profiler.section("xrd.chart"):
+            selected_samples = st.multiselect("Samples to overlay", xrd_index.samples,
+                                              default=xrd_index.samples[:2], key="xrd_samples")
             
-            zno_data = df[df['Sample'] == 'ZnO']
-            znomg_data = df[df['Sample'] == 'ZnO:Mg']
-            
-            fig.add_trace(go.Scatter(x=zno_data['2Theta'], y=zno_data['I'],
-                                   mode='lines+markers', name='ZnO Pure',
-                                   line=dict(color='cyan', width=3)))
+            # XRD visualization, keyed on sample revisions rather than hashing the data
+            if selected_samples:
+                fig = cached_figure(
+                    "xrd_comparison",
+                    lambda: create_xrd_comparison_plot({name: xrd_index.frame(name) for name in selected_samples},
+                                                       max_points=XRD_OVERLAY_MAX_POINTS),
+                    [(name, xrd_index.revision(name)) for name in selected_samples], XRD_OVERLAY_MAX_POINTS)
+                st.plotly_chart(fig, use_container_width=True)
+            else:
+                st.info("Select one or more samples to overlay.")
             
-            fig.add_trace(go.Scatter(x=znomg_data['2Theta'], y=znomg_data['I'],
-                                   mode='lines+markers', name='ZnO:Mg Doped',
-                                   line=dict(color='magenta', width=3)))
+            # Peak analysis: d-spacing and Scherrer crystallite size per reflection
+            with st.expander("🧮 Peak Analysis"), profiler.section("xrd.peak_analysis"):
+                analyzer = get_xrd_analyzer()
+                peaks = analyzer.analyze(xrd_index.select(selected_samples))
+                if not peaks.empty:
+                    st.dataframe(analyzer.summarize(peaks), use_container_width=True)
+                st.dataframe(peaks, use_container_width=True)
             
-            fig.update_layout(
-                title="XRD Diffraction Patterns Comparison",
-                xaxis_title="2θ (degrees)",
-                yaxis_title="Intensity (a.u.)",
-                height=500,
-                plot_bgcolor='rgba(0,0,0,0)',
-                paper_bgcolor='rgba(0,0,0,0)',
-                font=dict(color='white', family='Orbitron')
-            )
+            # Lattice parameters from the indexed reflections, all selected samples in one solve
+            with st.expander("📐 Lattice Refinement"), profiler.section("xrd.lattice"):
+                selection = xrd_index.select(selected_samples)
+                has_hkl = {"H", "K", "L"} <= set(selection.columns)
+                indexed = selection.dropna(subset=["H", "K", "L"]) if has_hkl else selection.iloc[:0]
+                if not indexed.empty:
+                    systems = list(LatticeRefiner.SYSTEMS)
+                    system = st.selectbox("Crystal system", systems, index=systems.index("hexagonal"),
+                                          key="lattice_system")
+                    lattice, reflections = LatticeRefiner(system).refine(indexed)
+                    lattice = lattice.set_index("Sample")
+                    baseline = lattice.iloc[0]
+                    for name in LatticeRefiner.SYSTEMS[system]:
+                        lattice[f"Δ{name}_vs_{baseline.name}_pct"] = (lattice[name] / baseline[name] - 1) * 100
+                    st.dataframe(lattice, use_container_width=True)
+                    if "bragg_ok" in lattice and not lattice["bragg_ok"].all():
+                        st.warning("2Theta and d_hkl disagree beyond the Bragg tolerance for: "
+                                   + ", ".join(lattice.index[~lattice["bragg_ok"]].astype(str)))
+                    st.dataframe(reflections, use_container_width=True, hide_index=True)
+                else:
+                    st.info("Lattice refinement needs indexed reflections (H, K, L columns).")
             
-            st.plotly_chart(fig, use_container_width=True)
+            with st.expander("➕ Add Samples"):
+                uploaded = st.file_uploader("Reflection table or scan (CSV with Sample, 2Theta, I columns)",
+                                            type="csv", key="xrd_upload")
+                if uploaded is not None and st.session_state.get("xrd_upload_id") != uploaded.file_id:
+                    st.session_state.xrd_upload_id = uploaded.file_id
+                    upload = pd.read_csv(uploaded)
+                    if "Sample" not in upload:
+                        upload.insert(0, "Sample", Path(uploaded.name).stem)
+                    if {"2Theta", "I"} <= set(upload.columns):
+                        added = xrd_index.add(upload)
+                        st.success(f"Added {len(added)} sample(s): {', '.join(map(str, added[:10]))}")
+                        st.rerun(scope="fragment")
+                    else:
+                        st.error("The CSV needs 2Theta and I columns.")
         
         with col2:
             st.markdown('<div class="metric-card">', unsafe_allow_html=True)
             st.markdown("### 📊 Analysis Results")
             
-            # Calculate metrics
-            zno_max = zno_data['I'].max()
-            znomg_max = znomg_data['I'].max()
-            improvement = ((znomg_max - zno_max) / zno_max) * 100
+            # Precomputed per-sample aggregates; the first selected sample is the baseline
+            if selected_samples:
+                aggregates = xrd_index.aggregates(selected_samples)
+                baseline = selected_samples[0]
+                baseline_max = aggregates.at[baseline, "max_I"]
+                st.metric(f"{baseline} Max Intensity", f"{baseline_max:.1f}")
+                if len(selected_samples) > 1:
+                    best = aggregates["max_I"].iloc[1:].idxmax()
+                    best_max = aggregates.at[best, "max_I"]
+                    improvement = ((best_max - baseline_max) / baseline_max) * 100
+                    st.metric(f"{best} Max Intensity", f"{best_max:.1f}")
+                    st.metric("Improvement", f"{improvement:+.1f}%")
+                st.dataframe(aggregates.assign(vs_baseline_pct=(aggregates["max_I"] / baseline_max - 1) * 100)
+                             .round(2), use_container_width=True)
             
-            st.metric("ZnO Max Intensity", f"{zno_max:.1f}")
-            st.metric("ZnO:Mg Max Intensity", f"{znomg_max:.1f}")
-            st.metric("Improvement", f"{improvement:+.1f}%")
-            
-            if st.button("🔍 AI Analysis", use_container_width=True):
-                with st.spinner("AI analyzing crystal structure..."):
-                    analysis = """
-                    **AI Analysis Summary:**
-                    ✅ Hexagonal wurtzite structure confirmed
-                    ✅ Successful Mg substitution detected
-                    ✅ Enhanced crystallinity observed
-                    ✅ Optimal doping concentration achieved
-                    
-                    **Recommendations:**
-                    • Suitable for transparent electronics
-                    • Excellent UV photodetector material
-                    • Ready for industrial scaling
-                    """
-                    st.success(analysis)
+            # Phase identification against the reference pattern library
+            max_shift = st.slider("2θ shift tolerance (°)", 0.0, 0.5, 0.2, 0.05, key="phase_max_shift")
+            metric = st.selectbox("Similarity", ["cosine", "correlation"], key="phase_metric")
+            if st.button("🔍 Identify Phases", use_container_width=True, disabled=not selected_samples):
+                with st.spinner("Matching against the reference library..."), profiler.section("xrd.phase_search"):
+                    phase_index = get_phase_index()
+                    patterns = [(xrd_index.frame(name)["2Theta"].to_numpy(), xrd_index.frame(name)["I"].to_numpy())
+                                for name in selected_samples]
+                    matches = phase_index.search_batch(patterns, k=3, max_shift=max_shift, metric=metric)
+                st.success("\n\n".join(
+                    f"**{name}:** {candidates[0]['phase']} (score {candidates[0]['score']:.2f}, "
+                    f"Δ2θ {candidates[0]['offset']:+.2f}°)"
+                    for name, candidates in zip(selected_samples, matches)))
+                st.dataframe(pd.DataFrame([{"Sample": name, "rank": rank + 1, **candidate}
+                                           for name, candidates in zip(selected_samples, matches)
+                                           for rank, candidate in enumerate(candidates)]).round(3),
+                             use_container_width=True, hide_index=True)
+                st.caption(f"{len(phase_index)} reference patterns")
             
             st.markdown('</div>', unsafe_allow_html=True)
-    
-    with tab2:
+        
+        # Raw diffractogram runs from the on-disk cache
+        with st.expander("📂 Raw Diffractogram Runs"):
+            scan_dir = st.text_input("Scan directory (.xy, .csv, .npy, .bin)", SCAN_DIR)
+            scan_path = Path(scan_dir).resolve()
+            if scan_path != SCAN_ROOT and SCAN_ROOT not in scan_path.parents:
+                st.error(f"Scan directories must be inside `{SCAN_ROOT}` (MATAI_SCAN_ROOT)")
+            elif scan_path.is_dir():
+                scan_store = get_scan_store()
+                # The store is shared; list only the samples of this directory
+                directory_samples = {name: scan_store.index["samples"][name]
+                                     for name in scan_store.ingest_directory(scan_path)}
+                summary = pd.DataFrame([
+                    {"Sample": name, "Points": meta["n_points"],
+                     "2θ min": meta["two_theta_range"][0], "2θ max": meta["two_theta_range"][1]}
+                    for name, meta in directory_samples.items()
+                ])
+                st.dataframe(summary, use_container_width=True)
+                
+                selected = st.multiselect("Samples", list(directory_samples))
+                if selected:
+                    # Viewport: re-query the selected 2θ window at full resolution, then decimate
+                    ranges = [scan_store.index["samples"][name]["two_theta_range"] for name in selected]
+                    full_low = min(low for low, _ in ranges)
+                    full_high = max(high for _, high in ranges)
+                    view_col, points_col, method_col = st.columns([2, 1, 1])
+                    with view_col:
+                        view = st.slider("2θ window", full_low, full_high, (full_low, full_high),
+                                         key="scan_view") if full_high > full_low else (full_low, full_high)
+                    with points_col:
+                        max_points = st.number_input("Max points per trace", 200, 20000, 2000, 100)
+                    with method_col:
+                        method = st.selectbox("Decimation", ["minmax", "lttb"])
+                    
+                    scan_fig = go.Figure()
+                    for name in selected:
+                        two_theta, intensity = scan_store.query(name, *view)
+                        two_theta, intensity = decimate_trace(two_theta, intensity, max_points, method)
+                        scan_fig.add_trace(go.Scattergl(x=two_theta, y=intensity, mode='lines', name=name))
+                    scan_fig.update_layout(
+                        xaxis_title="2θ (degrees)",
+                        yaxis_title="Intensity (a.u.)",
+                        height=450,
+                        plot_bgcolor='rgba(0,0,0,0)',
+                        paper_bgcolor='rgba(0,0,0,0)',
+                        font=dict(color='white', family='Orbitron')
+                    )
+                    st.plotly_chart(scan_fig, use_container_width=True)
+                    
+                    if st.button("➕ Add to sample overlay"):
+                        xrd_index.add(scan_store.to_frame(selected))
+                        st.rerun(scope="fragment")
+                    
+                    analyzer = get_xrd_analyzer()
+                    scan_peaks = analyzer.analyze(scan_store.to_frame(selected))
+                    st.dataframe(analyzer.summarize(scan_peaks), use_container_width=True)
+                    st.dataframe(scan_peaks, use_container_width=True)
+            else:
+                st.caption(f"No scan directory at `{scan_dir}`")
+
+@st.fragment
+def render_think_tank_tool():
+    """AI Think Tank consultation and knowledge base"""
+    profiler = get_profiler()
+    ai_agent = get_ai_agent()
+    with profiler.section("tab.think_tank"):
         st.markdown("## 🧠 AI Think Tank Collective")
         
         col1, col2 = st.columns([2, 1])
@@ -508,24 +481,32 @@ def main():
             
             if st.button("🚀 Consult Think Tank", use_container_width=True):
                 if question:
-                    with st.spinner("🤔 AI experts are thinking..."):
-                        # Show thinking process
-                        thinking_placeholder = st.empty()
-                        for i in range(4):
-                            thinking_placeholder.markdown(f'<div class="thinking-bubble">💭 Step {i+1}: Processing your question...</div>', unsafe_allow_html=True)
-                            time.sleep(0.8)
-                        
+                    # Cancel any answer still streaming from a previous run
+                    previous_cancel = st.session_state.get("think_tank_cancel")
+                    if previous_cancel is not None:
+                        previous_cancel.set()
+                    cancel_event = threading.Event()
+                    st.session_state.think_tank_cancel = cancel_event
+                    
+                    thinking_placeholder = st.empty()
+                    
+                    def answer_tokens():
+                        for kind, text in ai_agent.think_tank_stream(question, cancel_event):
+                            if kind == "step":
+                                thinking_placeholder.markdown(f'<div class="thinking-bubble">💭 {text}</div>', unsafe_allow_html=True)
+                            else:
+                                yield text
                         thinking_placeholder.empty()
-                        
-                        response = ai_agent.think_tank_response(question)
-                        st.markdown(response)
-                        
-                        # Add to chat history
-                        ai_agent.chat_history.append({
-                            "question": question,
-                            "response": response,
-                            "timestamp": datetime.now()
-                        })
+                    
+                    with profiler.section("think_tank.response"):
+                        response = st.write_stream(profiler.first_item("think_tank.ttft", answer_tokens()))
+                    
+                    # Add to this session's Think Tank history
+                    st.session_state.setdefault("think_tank_history", []).append({
+                        "question": question,
+                        "response": response,
+                        "timestamp": datetime.now()
+                    })
                 else:
                     st.warning("Please enter your question.")
             
@@ -542,12 +523,24 @@ def main():
                 for trend, value in ai_agent.knowledge_base["market_trends"].items():
                     st.write(f"**{trend.replace('_', ' ').title()}:** {value}")
             
+            with st.expander("⚡ Answer Cache"):
+                cache_stats = ai_agent.response_cache.snapshot()
+                st.write(f"**Entries:** {cache_stats['entries']}")
+                st.write(f"**Hits:** {cache_stats['hits']} (disk: {cache_stats['disk_hits']})")
+                st.write(f"**Misses:** {cache_stats['misses']}")
+                st.write(f"**Evictions:** {cache_stats['evictions']}")
+            
             with st.expander("⚡ Real-time Updates"):
                 st.write("🔄 Monitoring 2,847 research papers")
                 st.write("📈 Tracking 156 market signals")
                 st.write("🤖 Processing 1,234 AI discoveries")
-    
-    with tab3:
+
+@st.fragment
+def render_usp_tool():
+    """USP deposition simulator and parameter optimizer"""
+    profiler = get_profiler()
+    usp_simulator = get_usp_simulator()
+    with profiler.section("tab.usp"):
         st.markdown("## 🌊 Ultrasonic Spray Pyrolysis Simulator")
         
         col1, col2 = st.columns([1, 2])
@@ -571,12 +564,81 @@ def main():
                 "flow_rate": flow_rate
             }
             
+            resolution = st.selectbox("Output resolution", ["Adaptive (solver steps)", 100, 500, 2000], index=1)
+            compact = st.toggle("Compact float32 output", value=False)
+            
             if st.button("🚀 Run Simulation", use_container_width=True):
-                st.session_state.simulation_data = usp_simulator.simulate_deposition(params)
+                with profiler.section("usp.simulate"):
+                    st.session_state.simulation_data = usp_simulator.simulate_deposition(
+                        params,
+                        n_points=None if isinstance(resolution, str) else resolution,
+                        dtype=np.float32 if compact else np.float64)
                 st.session_state.show_simulation = True
             
             st.markdown('</div>', unsafe_allow_html=True)
-            
+
+            # Parameter optimizer
+            with st.expander("🎯 Parameter Optimizer"):
+                bounds = {}
+                for name, label, step in [("temperature", "Temperature (°C)", 1),
+                                          ("frequency", "Frequency (MHz)", 0.1),
+                                          ("time", "Deposition Time (min)", 1),
+                                          ("concentration", "Solution Concentration (mol/L)", 0.01),
+                                          ("flow_rate", "Flow Rate (ml/min)", 1)]:
+                    low, high = usp_simulator.param_bounds[name]
+                    bounds[name] = st.slider(f"{label} range", low, high, (low, high), step,
+                                             key=f"opt_{name}")
+                budget = st.number_input("Evaluation budget", min_value=100, max_value=1_000_000,
+                                         value=5000, step=100)
+
+                if st.button("🎯 Optimize Parameters", use_container_width=True):
+                    with profiler.section("usp.optimize"):
+                        result = usp_simulator.optimize_parameters(bounds=bounds, budget=budget)
+                    st.session_state.optimization_result = result
+                    st.session_state.simulation_data = usp_simulator.simulate_deposition(result["best_params"])
+                    st.session_state.show_simulation = True
+
+                if "optimization_result" in st.session_state:
+                    result = st.session_state.optimization_result
+                    st.success(f"Best score {result['best_score']:.1f}/100 after "
+                               f"{result['evaluations']:,} evaluations in {result['wall_time']*1000:.1f} ms")
+                    st.dataframe(pd.DataFrame([result["best_params"]]).T.rename(columns={0: "Optimum"}),
+                                 use_container_width=True)
+
+            # Monte Carlo uncertainty around the current slider settings
+            with st.expander("🎲 Uncertainty Analysis"):
+                tolerances = {}
+                for name, label, step in [("temperature", "Temperature ±σ (°C)", 0.5),
+                                          ("frequency", "Frequency ±σ (MHz)", 0.01),
+                                          ("time", "Deposition Time ±σ (min)", 0.05),
+                                          ("concentration", "Concentration ±σ (mol/L)", 0.001),
+                                          ("flow_rate", "Flow Rate ±σ (ml/min)", 0.05)]:
+                    tolerances[name] = st.number_input(label, min_value=0.0,
+                                                       value=float(usp_simulator.param_tolerances[name]),
+                                                       step=step, format="%.3f", key=f"mc_{name}")
+                n_samples = st.select_slider("Samples", [10_000, 100_000, 1_000_000], value=100_000)
+                mc_seed = st.number_input("Seed", min_value=0, value=0, step=1)
+                
+                if st.button("🎲 Run Monte Carlo", use_container_width=True):
+                    with profiler.section("usp.uncertainty"):
+                        st.session_state.uncertainty_result = usp_simulator.propagate_uncertainty(
+                            params, tolerances, n_samples=n_samples, seed=int(mc_seed))
+                
+                if "uncertainty_result" in st.session_state:
+                    result = st.session_state.uncertainty_result
+                    percentiles = result["percentiles"]
+                    st.success(f"Quality {result['mean']:.1f} ± {result['std']:.2f} "
+                               f"(nominal {result['nominal_quality']:.1f}) from {result['n_samples']:,} "
+                               f"samples in {result['wall_time']*1000:.0f} ms")
+                    st.write(f"**p5 / p50 / p95:** {percentiles['p5']:.1f} / {percentiles['p50']:.1f} / "
+                             f"{percentiles['p95']:.1f} · **P(quality < 80):** {result['p_below'][80]:.1%}")
+                    histogram = pd.DataFrame({"quality": result["histogram"]["edges"][:-1],
+                                              "runs": result["histogram"]["counts"]})
+                    histogram = histogram[histogram["runs"] > 0]
+                    st.bar_chart(histogram.set_index("quality"), height=200)
+                    st.dataframe(pd.DataFrame(result["sensitivity"]).set_index("parameter").round(4),
+                                 use_container_width=True)
+
             # Educational info
             with st.expander("📚 How USP Works"):
                 st.write("""
@@ -596,9 +658,17 @@ def main():
         
         with col2:
             if hasattr(st.session_state, 'show_simulation') and st.session_state.show_simulation:
-                simulation_fig = create_usp_simulation_plot(st.session_state.simulation_data)
+                with profiler.section("usp.figure"):
+                    simulation_data = st.session_state.simulation_data
+                    simulation_fig = cached_figure("usp_simulation",
+                                                   lambda: create_usp_simulation_plot(simulation_data),
+                                                   simulation_data)
                 st.plotly_chart(simulation_fig, use_container_width=True)
                 
+                st.caption(f"Integrated in {simulation_data['steps']} adaptive steps "
+                           f"({simulation_data['rejected_steps']} rejected), "
+                           f"{len(simulation_data['time'])} output points")
+                
                 # Quality assessment
                 quality = st.session_state.simulation_data["final_quality"]
                 if quality >= 80:
@@ -611,62 +681,73 @@ def main():
                 st.info("👈 Set parameters and click 'Run Simulation' to see results")
                 
                 # Show example visualization
-                example_data = usp_simulator.simulate_deposition()
-                example_fig = create_usp_simulation_plot(example_data)
+                with profiler.section("usp.example_simulation"):
+                    example_data = usp_simulator.simulate_deposition()
+                with profiler.section("usp.figure"):
+                    example_fig = cached_figure("usp_simulation", lambda: create_usp_simulation_plot(example_data),
+                                                example_data)
                 st.plotly_chart(example_fig, use_container_width=True)
-    
-    with tab4:
+
+@st.fragment
+def render_chat_tool():
+    """Chat research assistant"""
+    profiler = get_profiler()
+    ai_agent = get_ai_agent()
+    with profiler.section("tab.chat"):
         st.markdown("## 💬 AI Research Assistant")
         
         st.markdown('<div class="chat-panel">', unsafe_allow_html=True)
         
-        # Chat interface
-        if "chat_messages" not in st.session_state:
-            st.session_state.chat_messages = [
-                {"role": "assistant", "content": "👋 Hi! I'm your AI research assistant. Ask me anything about materials science, USP processes, or market trends!"}
-            ]
+        # Chat interface: recent window from session state, earlier pages from the store
+        chat = get_chat_session()
+        messages = chat.visible(earlier=st.session_state.get("chat_earlier", 0))
+        remaining = chat.remaining_before(messages)
+        if remaining:
+            st.button(f"⬆️ Load earlier messages ({remaining} more)", on_click=load_earlier_chat)
+        else:
+            with st.chat_message("assistant"):
+                st.write(CHAT_GREETING)
         
         # Display chat history
-        for message in st.session_state.chat_messages:
+        for message in messages:
             with st.chat_message(message["role"]):
                 st.write(message["content"])
         
         # Chat input
         if prompt := st.chat_input("Ask me about materials science..."):
             # Add user message
-            st.session_state.chat_messages.append({"role": "user", "content": prompt})
+            chat.append("user", prompt)
             
             with st.chat_message("user"):
                 st.write(prompt)
             
-            # Generate AI response
+            # Stream the AI response as it is produced
+            previous_cancel = st.session_state.get("chat_cancel")
+            if previous_cancel is not None:
+                previous_cancel.set()
+            cancel_event = threading.Event()
+            st.session_state.chat_cancel = cancel_event
+            
             with st.chat_message("assistant"):
-                with st.spinner("Thinking..."):
+                status_placeholder = st.empty()
+                
+                def response_tokens():
                     if "help" in prompt.lower():
-                        response = """
-                        🤖 **I can help you with:**
-                        
-                        • **Materials Analysis**: XRD patterns, crystal structures, doping effects
-                        • **Process Optimization**: USP parameters, synthesis conditions
-                        • **Market Intelligence**: Industry trends, business opportunities
-                        • **Technical Questions**: Properties, applications, characterization
-                        • **Research Guidance**: Experimental design, data interpretation
-                        
-                        Just ask me anything! I have access to real-time research data and expert knowledge.
-                        """
-                    elif any(word in prompt.lower() for word in ["market", "business", "industry"]):
-                        response = ai_agent._market_expert_response(prompt)
-                    elif any(word in prompt.lower() for word in ["usp", "spray", "pyrolysis"]):
-                        response = ai_agent._usp_expert_response(prompt)
-                    elif any(word in prompt.lower() for word in ["zno", "zinc", "doping"]):
-                        response = ai_agent._zno_expert_response(prompt)
-                    else:
-                        response = ai_agent.think_tank_response(prompt)
-                    
-                    st.write(response)
-                    
-                    # Add AI response to chat
-                    st.session_state.chat_messages.append({"role": "assistant", "content": response})
+                        yield from re.findall(r"\s*\S+", CHAT_HELP)
+                        return
+                    for kind, text in ai_agent.think_tank_stream(prompt, cancel_event):
+                        if kind == "step":
+                            status_placeholder.caption(text)
+                        else:
+                            status_placeholder.empty()
+                            yield text
+                    status_placeholder.empty()
+                
+                with profiler.section("chat.response"):
+                    response = st.write_stream(profiler.first_item("chat.ttft", response_tokens()))
+            
+            # Add AI response to chat
+            chat.append("assistant", response)
         
         st.markdown('</div>', unsafe_allow_html=True)
         
@@ -694,14 +775,18 @@ def main():
                 • Calibrate temperature with IR thermometry
                 """
                 st.info(tips)
-    
-    with tab5:
+
+@st.fragment
+def render_market_tool():
+    """Market intelligence dashboard"""
+    profiler = get_profiler()
+    with profiler.section("tab.market"):
         st.markdown("## 📈 Market Intelligence Dashboard")
         
         # Market metrics
         col1, col2 = st.columns([2, 1])
         
-        with col1:
+        with col1, profiler.section("market.chart"):
             # Market trend visualization
             years = list(range(2020, 2031))
             zno_market = [1.2 + i*0.15 + random.uniform(-0.1, 0.1) for i in range(len(years))]
@@ -767,5 +852,13 @@ def main():
             • Industry partnerships: +28% YoY
             """)
 
+TOOLS = {
+    "🔬 XRD Analysis": render_xrd_tool,
+    "🤖 AI Think Tank": render_think_tank_tool,
+    "🌊 USP Simulation": render_usp_tool,
+    "💬 Chat Assistant": render_chat_tool,
+    "📈 Market Intelligence": render_market_tool
+}
+
 if __name__ == "__main__":
     main()
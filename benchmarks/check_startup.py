@@ -0,0 +1,106 @@
+"""Import-time and cold-start budget check for the matai engine package.
+
+Usage:
+    python benchmarks/check_startup.py              # exit 1 if any budget is exceeded
+    python benchmarks/check_startup.py --runs 9 --scale 2.0
+
+Each case runs in a fresh interpreter. Its cost is the median wall time
+minus a bare ``python -c pass`` startup, so budgets do not depend on the
+interpreter itself. After the case runs, the listed heavy modules must not
+have been imported.
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+
+ROOT = Path(__file__).resolve().parent.parent
+UI_MODULES = ["streamlit", "plotly", "pandas"]
+
+# name: (code, budget in ms above bare interpreter startup, modules that must stay unimported)
+CASES = {
+    "import matai": (
+        "import matai",
+        25, UI_MODULES + ["numpy", "requests"]),
+    "usp.simulate cold": (
+        "from matai import USPSimulator; USPSimulator().simulate_deposition()",
+        300, UI_MODULES + ["requests"]),
+    "usp.optimize cold": (
+        "from matai import USPSimulator; USPSimulator().optimize_parameters(budget=500, seed=0)",
+        350, UI_MODULES + ["requests"]),
+    "think_tank cold answer": (
+        "from matai import EnhancedMaterialAI; EnhancedMaterialAI().think_tank_response('Mg doping in ZnO')",
+        450, UI_MODULES + ["requests"]),
+    "xrd + plots import": (
+        "import matai.xrd, matai.plots, matai.profiling",
+        300, UI_MODULES + ["requests"]),
+    "cli import": (
+        "import matai.cli",
+        350, UI_MODULES + ["requests"]),
+}
+
+
+PROBE = """
+import sys, time
+start = time.perf_counter()
+{code}
+elapsed = time.perf_counter() - start
+print(__import__("json").dumps({{"ms": elapsed * 1000, "loaded": [m for m in {forbidden!r} if m in sys.modules]}}))
+"""
+
+
+def run_python(code):
+    # Model endpoint settings would pull in requests; cold starts are measured without them
+    env = {key: value for key, value in os.environ.items() if not key.startswith("MATAI_LLM_")}
+    start = time.perf_counter()
+    output = subprocess.run([sys.executable, "-c", code], cwd=ROOT, env=env, check=True,
+                            capture_output=True, text=True).stdout
+    return (time.perf_counter() - start) * 1000, output
+
+
+def measure(code, forbidden, runs):
+    wall, inner, loaded = [], [], set()
+    for _ in range(runs):
+        elapsed, output = run_python(PROBE.format(code=code, forbidden=forbidden))
+        report = json.loads(output.strip().splitlines()[-1])
+        wall.append(elapsed)
+        inner.append(report["ms"])
+        loaded.update(report["loaded"])
+    return statistics.median(wall), statistics.median(inner), sorted(loaded)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--runs", type=int, default=5, help="fresh interpreters per case (median is used)")
+    parser.add_argument("--scale", type=float, default=1.0, help="multiply all budgets, e.g. for slow CI hosts")
+    parser.add_argument("--filter", default="", help="only run cases whose name contains this text")
+    args = parser.parse_args(argv)
+    
+    bare = statistics.median(run_python("pass")[0] for _ in range(args.runs))
+    print(f"bare interpreter startup: {bare:.1f} ms")
+    failures = []
+    for name, (code, budget_ms, forbidden) in CASES.items():
+        if args.filter not in name:
+            continue
+        wall, inner, loaded = measure(code, forbidden, args.runs)
+        budget = budget_ms * args.scale
+        cost = wall - bare
+        status = "ok" if cost <= budget and not loaded else "FAIL"
+        print(f"{name:<26} {cost:>8.1f} ms (in-process {inner:>7.1f} ms, budget {budget:>6.0f} ms) {status}")
+        if cost > budget:
+            failures.append(f"{name}: {cost:.1f} ms exceeds the {budget:.0f} ms budget")
+        if loaded:
+            failures.append(f"{name}: imported {', '.join(loaded)}")
+    
+    for failure in failures:
+        print(f"BUDGET {failure}")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
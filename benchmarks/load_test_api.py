@@ -0,0 +1,84 @@
+"""Closed-loop load test for the engine API (``python -m matai serve``).
+
+Usage:
+    python benchmarks/load_test_api.py --url http://127.0.0.1:8000 --concurrency 64 --requests 5000
+    python benchmarks/load_test_api.py --endpoint simulate --concurrency 16
+
+Each of ``--concurrency`` clients sends requests back to back over a shared
+HTTP/1.1 connection pool. The report lists throughput, latency percentiles
+and how many requests were rejected with 503 by the server's backpressure.
+"""
+import argparse
+import asyncio
+import random
+import statistics
+import sys
+import time
+
+import httpx
+
+
+def make_payload(endpoint, rng):
+    params = {
+        "temperature": rng.uniform(400, 500),
+        "frequency": rng.uniform(1.0, 2.5),
+        "time": rng.uniform(5, 30),
+        "concentration": rng.uniform(0.05, 0.3),
+        "flow_rate": rng.uniform(1, 8)
+    }
+    if endpoint == "quality":
+        return "/usp/quality", params
+    if endpoint == "simulate":
+        return "/usp/simulate", {"params": params}
+    if endpoint == "xrd":
+        two_theta = [20 + i * 0.01 for i in range(7000)]
+        intensity = [5 + 900 * 2.718 ** (-((x - 34.4) / 0.1) ** 2) for x in two_theta]
+        return "/xrd/analyze", {"samples": [{"sample": "S", "two_theta": two_theta, "intensity": intensity}]}
+    raise ValueError(endpoint)
+
+async def run(url, endpoint, concurrency, total):
+    rng = random.Random(0)
+    latencies, statuses = [], {}
+    remaining = total
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(base_url=url, limits=limits, timeout=30) as client:
+        async def worker():
+            nonlocal remaining
+            while remaining > 0:
+                remaining -= 1
+                path, payload = make_payload(endpoint, rng)
+                start = time.perf_counter()
+                try:
+                    status = (await client.post(path, json=payload)).status_code
+                except httpx.TransportError as exc:
+                    status = type(exc).__name__
+                latencies.append((time.perf_counter() - start) * 1000)
+                statuses[status] = statuses.get(status, 0) + 1
+        
+        start = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        elapsed = time.perf_counter() - start
+        metrics = (await client.get("/metrics")).text
+    
+    latencies.sort()
+    pick = lambda q: latencies[min(len(latencies) - 1, int(q * len(latencies)))]
+    print(f"{endpoint}: {len(latencies)} requests in {elapsed:.2f} s -> {len(latencies) / elapsed:,.0f} req/s")
+    print(f"latency ms: p50 {pick(0.5):.1f}  p95 {pick(0.95):.1f}  p99 {pick(0.99):.1f}  "
+          f"mean {statistics.mean(latencies):.1f}")
+    print(f"status codes: {statuses}")
+    print("\n".join(line for line in metrics.splitlines() if line.startswith("matai_api_")))
+    return 0 if set(statuses) <= {200, 503} else 1
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--url", default="http://127.0.0.1:8000")
+    parser.add_argument("--endpoint", choices=["quality", "simulate", "xrd"], default="quality")
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--requests", type=int, default=2000)
+    args = parser.parse_args(argv)
+    return asyncio.run(run(args.url, args.endpoint, args.concurrency, args.requests))
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,233 @@
+"""Headless benchmark suite for the simulation, XRD and plotting hot paths.
+
+Usage:
+    python benchmarks/run_benchmarks.py                  # run and compare with baseline
+    python benchmarks/run_benchmarks.py --save-baseline  # record a new baseline
+    python benchmarks/run_benchmarks.py --quick          # smaller synthetic datasets
+
+The engines are imported from the ``matai`` package, so Streamlit is
+never loaded. Each case reports throughput (ops/s, median of several timed rounds) and
+peak traced memory for one op. Results are compared against the baseline
+JSON, and the exit status is 1 when any case slows down by more than
+``--threshold``.
+"""
+import argparse
+import json
+import os
+import platform
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+os.chdir(ROOT)
+
+import numpy as np
+import pandas as pd
+
+from matai.agent import EnhancedMaterialAI
+from matai.cache import ResponseCache
+from matai.metrics import MetricsFeed, StubMetricsSource
+from matai.phases import PhaseIndex, builtin_references
+from matai.plots import FIGURE_THEME, FigureCache, create_usp_simulation_plot
+from matai.usp import USPSimulator
+from matai.xrd import LatticeRefiner, XRDSampleIndex, read_xrd_table
+
+DEFAULT_BASELINE = ROOT / "benchmarks" / "baseline.json"
+
+
+def measure(func, rounds=5, min_time=0.2):
+    """Return (ops_per_second, peak_memory_kb) for ``func``"""
+    func()  # warm-up
+    # Calibrate the loop count so each round lasts roughly ``min_time``
+    loops, elapsed = 1, 0.0
+    while True:
+        start = time.perf_counter()
+        for _ in range(loops):
+            func()
+        elapsed = time.perf_counter() - start
+        if elapsed >= min_time or loops >= 1_000_000:
+            break
+        loops *= 2 if elapsed == 0 else max(2, int(min_time / elapsed) + 1)
+    per_op = []
+    for _ in range(rounds):
+        start = time.perf_counter()
+        for _ in range(loops):
+            func()
+        per_op.append((time.perf_counter() - start) / loops)
+    
+    tracemalloc.start()
+    func()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return 1 / statistics.median(per_op), peak / 1024
+
+
+def synthetic_xrd_csv(directory, n_samples, points_per_sample):
+    """Write a long-format Sample/2Theta/I CSV and return its path"""
+    rng = np.random.default_rng(0)
+    two_theta = np.linspace(20, 90, points_per_sample)
+    frames = []
+    for i in range(n_samples):
+        intensity = 5 + rng.random(points_per_sample)
+        for center, width, height in [(31.8, 0.2, 300), (34.4, 0.15, 900), (36.3, 0.25, 800)]:
+            intensity += height * np.exp(-4 * np.log(2) * (two_theta - center) ** 2 / width ** 2)
+        frames.append(pd.DataFrame({"Sample": f"S{i}", "2Theta": two_theta, "I": intensity}))
+    path = Path(directory) / f"xrd_{n_samples}x{points_per_sample}.csv"
+    pd.concat(frames, ignore_index=True).to_csv(path, index=False)
+    return path
+
+
+def synthetic_phase_library(n_phases):
+    """Strained, re-weighted variants of the bundled reference cards"""
+    rng = np.random.default_rng(0)
+    cards = builtin_references()
+    references = []
+    for i in range(n_phases):
+        name, two_theta, intensity = cards[i % len(cards)]
+        references.append((f"{name} #{i}", two_theta * (1 + rng.normal(0, 0.01)),
+                           intensity * rng.uniform(0.5, 1.5, len(intensity))))
+    return references
+
+
+def build_cases(workdir, quick):
+    simulator = USPSimulator()
+    params = dict(simulator.default_params)
+    rng = np.random.default_rng(0)
+    n_batch = 2_000 if quick else 20_000
+    batch = pd.DataFrame({
+        "temperature": rng.uniform(400, 500, n_batch),
+        "frequency": rng.uniform(1.0, 2.5, n_batch),
+        "time": rng.uniform(5, 30, n_batch),
+        "concentration": rng.uniform(0.05, 0.3, n_batch),
+        "flow_rate": rng.uniform(1, 8, n_batch)
+    })
+    simulation = simulator.simulate_deposition(params)
+    figure_cache = FigureCache()
+    # A cache that keeps nothing, so every Think Tank call does the full work
+    agent = EnhancedMaterialAI(response_cache=ResponseCache(max_entries=0))
+    # Producer side (one per process) vs reader side (every session, every redraw)
+    metrics_feed = MetricsFeed(StubMetricsSource(seed=0))
+    metrics_feed.refresh()
+    
+    cases = {
+        "usp.simulate_deposition": lambda: simulator.simulate_deposition(params),
+        "usp.quality_score": lambda: simulator._calculate_quality_score(params),
+        f"usp.simulate_batch[{n_batch}]": lambda: simulator.simulate_batch(batch),
+        f"usp.simulate_batch_f32[{n_batch}]": lambda: simulator.simulate_batch(batch, dtype=np.float32),
+        "usp.stream_1M_points": lambda: sum(chunk["time"].shape[1] for chunk in simulator.iter_batch(
+            params, n_points=1_000_000, dtype=np.float32)),
+        f"usp.quality_score_batch[{n_batch}]": lambda: simulator._calculate_quality_score(batch),
+        "usp.uncertainty[1M]": lambda: simulator.propagate_uncertainty(n_samples=1_000_000, seed=0),
+        "plot.usp_figure_build": lambda: create_usp_simulation_plot(simulation),
+        "plot.usp_figure_build_serialize": lambda: create_usp_simulation_plot(simulation).to_json(),
+        "plot.usp_figure_cached": lambda: figure_cache.get_or_build(
+            FigureCache.make_key("usp_simulation", FIGURE_THEME, simulation),
+            lambda: create_usp_simulation_plot(simulation)),
+        "dashboard.metrics_refresh": metrics_feed.refresh,
+        "dashboard.metrics_snapshot": metrics_feed.snapshot,
+        "think_tank.retrieval": lambda: agent.retriever.search("How does Mg doping affect ZnO?", k=5),
+        "think_tank.response": lambda: agent.think_tank_response("How does Mg doping affect ZnO?")
+    }
+    sizes = [(2, 1_000), (20, 1_000), (20, 10_000)] if quick else [(2, 1_000), (20, 10_000), (100, 10_000)]
+    for n_samples, points in sizes:
+        path = synthetic_xrd_csv(workdir, n_samples, points)
+        
+        def load(path=path):
+            return read_xrd_table(str(path))
+        cases[f"xrd.load_xrd_data[{n_samples}x{points}]"] = load
+    
+    # Selecting a subset from a wide campaign: boolean masks vs the sample index
+    campaign = read_xrd_table(str(synthetic_xrd_csv(workdir, 50 if quick else 300, 200)))
+    sample_index = XRDSampleIndex(campaign)
+    subset = sample_index.samples[::10]
+    cases["xrd.select_subset_mask"] = lambda: [campaign[campaign["Sample"] == name] for name in subset]
+    cases["xrd.select_subset_index"] = lambda: [sample_index.frame(name) for name in subset]
+    cases["xrd.subset_aggregates_mask"] = lambda: [campaign[campaign["Sample"] == name]["I"].max()
+                                                   for name in subset]
+    cases["xrd.subset_aggregates_index"] = lambda: sample_index.aggregates(subset)
+    
+    # Lattice refinement over a campaign of indexed reflection tables in one stacked solve
+    reflections = read_xrd_table()
+    n_campaign = 1_000 if quick else 10_000
+    campaign_reflections = pd.concat([reflections.assign(Sample=reflections["Sample"] + f"#{i}")
+                                      for i in range(n_campaign // 2)], ignore_index=True)
+    refiner = LatticeRefiner()
+    cases[f"xrd.lattice_refine[{n_campaign}]"] = lambda: refiner.refine(campaign_reflections)
+    
+    # Phase identification: reference index built once, then memory-mapped
+    n_phases = 2_000 if quick else 20_000
+    references = synthetic_phase_library(n_phases)
+    phase_index = PhaseIndex.build(references, path=Path(workdir) / "phase_index")
+    patterns = [(group["2Theta"].to_numpy(), group["I"].to_numpy())
+                for _, group in read_xrd_table().groupby("Sample")]
+    cases[f"xrd.phase_index_build[{n_phases}]"] = lambda: PhaseIndex.build(references)
+    cases[f"xrd.phase_search[{n_phases}]"] = lambda: phase_index.search_batch(patterns, k=5)
+    cases[f"xrd.phase_search_shift[{n_phases}]"] = lambda: phase_index.search_batch(patterns, k=5, max_shift=0.3)
+    return cases
+
+
+def compare(results, baseline, threshold):
+    """Return (name, baseline_ops, current_ops, change) for regressed cases"""
+    regressions = []
+    for name, result in results.items():
+        reference = baseline.get("results", {}).get(name)
+        if not reference:
+            continue
+        change = result["ops_per_sec"] / reference["ops_per_sec"] - 1
+        if change < -threshold:
+            regressions.append((name, reference["ops_per_sec"], result["ops_per_sec"], change))
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--baseline", type=Path, default=DEFAULT_BASELINE)
+    parser.add_argument("--save-baseline", action="store_true", help="write results as the new baseline")
+    parser.add_argument("--threshold", type=float, default=0.2, help="allowed slowdown fraction (default 0.2)")
+    parser.add_argument("--quick", action="store_true", help="use smaller synthetic datasets")
+    parser.add_argument("--filter", default="", help="only run cases whose name contains this text")
+    parser.add_argument("--output", type=Path, help="also write results JSON here")
+    args = parser.parse_args(argv)
+    
+    results = {}
+    with tempfile.TemporaryDirectory() as workdir:
+        for name, func in build_cases(workdir, args.quick).items():
+            if args.filter not in name:
+                continue
+            ops, peak_kb = measure(func)
+            results[name] = {"ops_per_sec": ops, "peak_kb": peak_kb}
+            print(f"{name:<45} {ops:>12,.1f} ops/s {peak_kb:>12,.1f} KiB peak")
+    
+    report = {
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "numpy": np.__version__,
+        "pandas": pd.__version__,
+        "results": results
+    }
+    if args.output:
+        args.output.write_text(json.dumps(report, indent=2))
+    if args.save_baseline:
+        args.baseline.write_text(json.dumps(report, indent=2))
+        print(f"Baseline saved to {args.baseline}")
+        return 0
+    if not args.baseline.exists():
+        print(f"No baseline at {args.baseline}; run with --save-baseline to create one")
+        return 0
+    
+    regressions = compare(results, json.loads(args.baseline.read_text()), args.threshold)
+    for name, before, after, change in regressions:
+        print(f"REGRESSION {name}: {before:,.1f} -> {after:,.1f} ops/s ({change:+.0%})")
+    if not regressions:
+        print(f"No regressions beyond {args.threshold:.0%} against {args.baseline}")
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,41 @@
+"""MatAI engines: XRD analysis, USP simulation and the Think Tank.
+
+These modules do not import Streamlit, so they can be reused from the
+batch CLI (``python -m matai``) and other headless tools.
+
+Importing the package is cheap: engine classes are resolved on first
+access (``from matai import USPSimulator``), and pandas, Plotly and
+requests are only imported by the code paths that use them.
+``benchmarks/check_startup.py`` holds this to a time budget.
+"""
+import importlib
+
+_EXPORTS = {
+    "EnhancedMaterialAI": "matai.agent",
+    "ResponseCache": "matai.cache",
+    "ChatHistoryStore": "matai.history",
+    "ModelClient": "matai.llm",
+    "MetricsFeed": "matai.metrics",
+    "PhaseIndex": "matai.phases",
+    "FigureCache": "matai.plots",
+    "RerunProfiler": "matai.profiling",
+    "KnowledgeIndex": "matai.retrieval",
+    "USPSimulator": "matai.usp",
+    "LatticeRefiner": "matai.xrd",
+    "XRDAnalyzer": "matai.xrd",
+    "XRDSampleIndex": "matai.xrd",
+    "XRDScanStore": "matai.xrd",
+}
+
+__all__ = sorted(_EXPORTS)
+
+def __getattr__(name):
+    module = _EXPORTS.get(name)
+    if module is None:
+        raise AttributeError(f"module 'matai' has no attribute {name!r}")
+    value = getattr(importlib.import_module(module), name)
+    globals()[name] = value
+    return value
+
+def __dir__():
+    return sorted(set(globals()) | set(__all__))
@@ -0,0 +1,5 @@
+import sys
+
+from matai.cli import main
+
+sys.exit(main())
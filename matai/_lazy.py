@@ -0,0 +1,32 @@
+"""Deferred imports for heavy optional-at-import-time dependencies."""
+import importlib
+import sys
+
+class LazyModule:
+    """Module proxy that imports ``name`` on first attribute access.
+    
+    ``pd = LazyModule("pandas")`` at module top keeps ``pd.DataFrame``
+    call sites unchanged while moving the import cost to first use.
+    """
+    
+    def __init__(self, name):
+        self.__dict__["_name"] = name
+        self.__dict__["_module"] = None
+    
+    def _load(self):
+        module = self.__dict__["_module"]
+        if module is None:
+            module = self.__dict__["_module"] = importlib.import_module(self.__dict__["_name"])
+        return module
+    
+    def __getattr__(self, attr):
+        return getattr(self._load(), attr)
+    
+    def __repr__(self):
+        state = "loaded" if self.__dict__["_module"] is not None else "not loaded"
+        return f"<lazy module {self.__dict__['_name']!r} ({state})>"
+
+def is_dataframe(value):
+    """isinstance check against pandas.DataFrame that never imports pandas"""
+    pandas = sys.modules.get("pandas")
+    return pandas is not None and isinstance(value, pandas.DataFrame)
@@ -0,0 +1,279 @@
+"""Think Tank engine: retrieval, model client and answer cache."""
+import hashlib
+import json
+import os
+import random
+import re
+import time
+from pathlib import Path
+
+from matai.cache import ResponseCache
+from matai.llm import ModelClient, ModelClientError
+from matai.retrieval import KnowledgeIndex
+
+class EnhancedMaterialAI:
+    CORPUS_SUFFIXES = {".txt", ".md"}
+    
+    def __init__(self, corpus_dir="knowledge", index_dir="dataset/.knowledge_index", model_client=None,
+                 response_cache=None):
+        self.model_client = model_client if model_client is not None else ModelClient.from_env()
+        if response_cache is None:
+            response_cache = ResponseCache(db_path=os.environ.get("MATAI_RESPONSE_CACHE_DB"))
+        self.response_cache = response_cache
+        self.knowledge_base = self._init_knowledge_base()
+        self.corpus_dir = Path(corpus_dir)
+        self.retriever = self._init_retriever(index_dir)
+        
+    def _init_knowledge_base(self):
+        """Initialize with real-time materials science knowledge"""
+        return {
+            "recent_discoveries": [
+                "2024: Revolutionary quantum dots for solar cells achieve 47% efficiency",
+                "2024: AI-designed perovskite materials show 10x stability improvement",
+                "2023: Machine learning accelerates battery material discovery by 200%",
+                "2023: Novel 2D materials enable flexible electronics breakthrough"
+            ],
+            "usp_parameters": {
+                "temperature_range": "400-500°C",
+                "frequency": "1.6-2.0 MHz",
+                "deposition_time": "10-30 minutes",
+                "substrate_materials": ["Silicon", "Glass", "ITO", "Flexible polymer"]
+            },
+            "market_trends": {
+                "transparent_electronics": "$15.2B by 2028",
+                "quantum_dots": "25% CAGR",
+                "flexible_displays": "$8.9B market",
+                "energy_storage": "Fastest growing segment"
+            }
+        }
+    
+    def _init_retriever(self, index_dir):
+        """Load the persisted passage index, rebuilding it when the corpus changed"""
+        builtin = self._builtin_documents()
+        corpus_files = self._corpus_files()
+        digest = hashlib.sha1(f"v{KnowledgeIndex.FORMAT_VERSION}".encode("utf-8"))
+        digest.update(json.dumps(builtin, sort_keys=True).encode("utf-8"))
+        for path in corpus_files:
+            stat = path.stat()
+            digest.update(f"{path}:{stat.st_size}:{stat.st_mtime_ns}".encode("utf-8"))
+        
+        def load_documents():
+            documents = list(builtin)
+            for path in corpus_files:
+                documents.append({"source": path.name, "text": path.read_text(encoding="utf-8", errors="ignore")})
+            return documents
+        
+        return KnowledgeIndex.load_or_build(load_documents, index_dir, digest.hexdigest())
+    
+    def _corpus_files(self):
+        if not self.corpus_dir.is_dir():
+            return []
+        return sorted(p for p in self.corpus_dir.rglob("*") if p.suffix.lower() in self.CORPUS_SUFFIXES)
+    
+    def _builtin_documents(self):
+        """Knowledge base entries and expert briefs as retrievable documents"""
+        kb = self.knowledge_base
+        documents = [
+            {"source": "Recent discoveries", "text": "\n\n".join(kb["recent_discoveries"])},
+            {"source": "USP parameters", "text": "\n\n".join(
+                f"USP {key.replace('_', ' ')}: {', '.join(value) if isinstance(value, list) else value}"
+                for key, value in kb["usp_parameters"].items())},
+            {"source": "Market trends", "text": "\n\n".join(
+                f"{key.replace('_', ' ').title()} market: {value}" for key, value in kb["market_trends"].items())}
+        ]
+        experts = [("ZnO materials expert", self._zno_expert_response),
+                   ("Spray pyrolysis expert", self._usp_expert_response),
+                   ("Market intelligence expert", self._market_expert_response)]
+        for source, expert in experts:
+            paragraphs, section = [], ""
+            for line in (line.strip() for line in expert("").splitlines()):
+                if line.startswith("•"):
+                    paragraphs.append(f"{section} {line.lstrip('• ')}".strip())
+                elif line.endswith("**"):
+                    section = line.replace("**", "")
+                elif line:
+                    paragraphs.append(line.replace("**", ""))
+            documents.append({"source": source, "text": "\n\n".join(paragraphs)})
+        return documents
+    
+    def get_realtime_insights(self, query="materials science breakthroughs"):
+        """Simulate real-time knowledge retrieval"""
+        insights = [
+            f"🔥 Breaking: New {random.choice(['ZnO', 'perovskite', 'graphene', 'quantum dot'])} research shows {random.randint(20,80)}% efficiency boost",
+            f"📈 Market Alert: {random.choice(['Solar cells', 'LED displays', 'Sensors', 'Batteries'])} sector growing {random.randint(15,35)}% annually",
+            f"🧪 Lab Update: AI-optimized synthesis reduces costs by {random.randint(30,70)}%",
+            f"🚀 Innovation: {random.choice(['MIT', 'Stanford', 'NREL', 'Tokyo Tech'])} develops next-gen materials platform"
+        ]
+        return random.choice(insights)
+    
+    def think_tank_response(self, question):
+        """AI Think Tank with reasoning process"""
+        return "".join(text for kind, text in self.think_tank_stream(question) if kind == "token")
+    
+    def think_tank_stream(self, question, cancel_event=None):
+        """Stream the Think Tank answer as ("step", text) and ("token", text) events.
+        
+        Steps are emitted as each stage of the pipeline completes rather than
+        on a timer. Setting ``cancel_event`` stops the stream at the next
+        event boundary, e.g. when the user reruns the app mid-answer.
+        """
+        def cancelled():
+            return cancel_event is not None and cancel_event.is_set()
+        
+        started = time.perf_counter()
+        passages = self.retriever.search(question, k=5)
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        yield ("step", f"🔍 Retrieved {len(passages)} passages in {elapsed_ms:.1f} ms")
+        if cancelled():
+            return
+        
+        model = self.model_client.model if self.model_client is not None else "retrieval"
+        cache_key = ResponseCache.make_key(question, model, *(p["text"] for p in passages))
+        cached = self.response_cache.get(cache_key)
+        if cached is not None:
+            yield ("step", "⚡ Served from answer cache")
+            for token in re.findall(r"\s*\S+", cached):
+                if cancelled():
+                    return
+                yield ("token", token)
+            return
+        
+        if self.model_client is not None:
+            yield ("step", f"🧠 Consulting {self.model_client.model}...")
+            tokens = []
+            try:
+                for token in self.model_client.stream_chat(self._model_messages(question, passages),
+                                                           cancel_event=cancel_event):
+                    tokens.append(token)
+                    yield ("token", token)
+                if tokens and not cancelled():
+                    self.response_cache.put(cache_key, "".join(tokens))
+                return
+            except ModelClientError:
+                if tokens:
+                    return
+                yield ("step", "⚠️ Model unavailable, answering from retrieved knowledge")
+            # A fallback answer must not be cached under the model's key
+            cache_key = ResponseCache.make_key(question, "retrieval", *(p["text"] for p in passages))
+        
+        if passages:
+            response = self._retrieval_response(question, passages)
+        else:
+            response = self._general_expert_response(question)
+        yield ("step", "💡 Formulating comprehensive response...")
+        for token in re.findall(r"\s*\S+", response):
+            if cancelled():
+                return
+            yield ("token", token)
+        self.response_cache.put(cache_key, response)
+    
+    def _model_messages(self, question, passages):
+        context = "\n".join(f"[{p['source']}] {p['text']}" for p in passages)
+        return [
+            {"role": "system", "content": "You are a materials science research assistant. "
+                                          "Answer using the retrieved context where relevant.\n\n"
+                                          f"Context:\n{context or 'No matching passages.'}"},
+            {"role": "user", "content": question}
+        ]
+    
+    def _retrieval_response(self, question, passages):
+        findings = "\n        ".join(f"• {p['text']} _({p['source']})_" for p in passages)
+        return f"""
+        🧠 **AI Think Tank Collective Response:**
+        
+        **Most relevant findings for "{question[:50]}":**
+        {findings}
+        
+        **Next Steps:** Would you like me to dive deeper into any specific aspect?
+        """
+    
+    def _zno_expert_response(self, question):
+        return """
+        🔬 **ZnO Materials Expert Analysis:**
+        
+        **Key Insights:**
+        • ZnO is a wide bandgap semiconductor (3.37 eV) ideal for UV applications
+        • Mg doping creates quantum confinement effects, tuning optical properties
+        • Wurtzite crystal structure provides excellent mechanical stability
+        
+        **Real-world Applications:**
+        • Smartphone screens (transparent conductors)
+        • Solar panels (anti-reflective coatings)
+        • Medical devices (antibacterial surfaces)
+        
+        **Market Potential:** $2.8B by 2027 (CAGR: 6.2%)
+        
+        **Optimization Tips:**
+        • Use 0.05-0.10 mol Mg for optimal transparency
+        • 450°C deposition temperature balances quality and efficiency
+        • Post-annealing improves crystallinity by 40%
+        """
+    
+    def _usp_expert_response(self, question):
+        return """
+        🌊 **Ultrasonic Spray Pyrolysis Expert:**
+        
+        **Process Advantages:**
+        • Uniform film thickness (±5% variation)
+        • Scalable from lab to industrial production
+        • Low-cost equipment and materials
+        
+        **Key Parameters:**
+        • Frequency: 1.7 MHz (optimal droplet size)
+        • Temperature: 450°C (complete decomposition)
+        • Carrier gas: Air or N₂ (controls atmosphere)
+        
+        **Quality Factors:**
+        • Substrate preheating: Improves adhesion 3x
+        • Solution concentration: 0.1-0.3 M optimal
+        • Spray rate: 2-5 ml/min for uniform coating
+        
+        **Industrial Applications:** Display manufacturing, solar cell production, sensor fabrication
+        """
+    
+    def _market_expert_response(self, question):
+        return """
+        📊 **Market Intelligence Analysis:**
+        
+        **Current Trends:**
+        • AI-driven materials discovery: $1.2B investment in 2024
+        • Sustainable manufacturing: 45% industry priority
+        • Flexible electronics: Fastest growing segment
+        
+        **Business Opportunities:**
+        • SaaS Analytics Platform: $500K-2M ARR potential
+        • Custom AI Solutions: $50K-500K per project
+        • Data Licensing: $10K-100K per dataset
+        
+        **Competitive Advantage:**
+        • 10x faster R&D cycles with AI automation
+        • 60% cost reduction in materials testing
+        • Real-time optimization capabilities
+        
+        **Investment Climate:** VCs investing $3.2B in materials tech (2024)
+        """
+    
+    def _general_expert_response(self, question):
+        return f"""
+        🧠 **AI Think Tank Collective Response:**
+        
+        **Multi-disciplinary Analysis:**
+        Based on your question about "{question[:50]}...", our AI experts suggest:
+        
+        **Scientific Perspective:**
+        • Latest research indicates promising developments in this area
+        • Cross-material comparisons show significant potential
+        • Experimental validation recommended for optimization
+        
+        **Technical Implementation:**
+        • Scalable synthesis methods available
+        • Quality control protocols well-established
+        • Cost-effective production pathways identified
+        
+        **Market Validation:**
+        • Strong industry demand signals
+        • Multiple application opportunities
+        • Favorable investment climate
+        
+        **Next Steps:** Would you like me to dive deeper into any specific aspect?
+        """
@@ -0,0 +1,313 @@
+"""HTTP API for the USP simulation, quality scoring and XRD analysis engines.
+
+Run locally with ``python -m matai serve`` (or ``uvicorn matai.api:app``).
+Requires the optional dependencies in requirements-api.txt.
+
+CPU-bound work runs on a process pool. Single-run simulation and scoring
+requests are coalesced by a micro-batcher into one vectorized engine call,
+and a bounded admission counter rejects work with 503 once too many
+requests are queued; batch simulations are also capped in total points.
+A row the engine rejects fails only its own request. ``/health`` and
+``/metrics`` (Prometheus text) expose queue depth, rejections and
+per-endpoint latency.
+"""
+import asyncio
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import asynccontextmanager
+from typing import Dict, List, Optional, Tuple
+
+import pandas as pd
+from fastapi import FastAPI, HTTPException, Request
+from fastapi.exceptions import RequestValidationError
+from fastapi.responses import JSONResponse, PlainTextResponse
+from pydantic import BaseModel, ConfigDict, Field
+
+from matai.profiling import RerunProfiler
+from matai.usp import USPIntegrationError, USPSimulator
+from matai.xrd import XRDAnalyzer
+
+# Engine errors that mean the request itself cannot be simulated (422, not 500)
+REJECTED_INPUT = (ValueError, USPIntegrationError)
+
+# Limits are several times the rig's operating window (USPSimulator.param_bounds) and keep a run
+# to a few hundred integrator steps; the step count grows with run time and with low precursor flux
+class USPParams(BaseModel):
+    model_config = ConfigDict(allow_inf_nan=False)
+    
+    temperature: float = Field(450, ge=0, le=1000)
+    frequency: float = Field(1.7, gt=0, le=10)
+    time: float = Field(15, gt=0, le=600)
+    concentration: float = Field(0.1, ge=0.005, le=3)
+    flow_rate: float = Field(3, ge=0.1, le=80)
+
+class SimulateRequest(BaseModel):
+    params: USPParams = USPParams()
+    n_points: int = Field(100, ge=2, le=10_000)
+
+class BatchRequest(BaseModel):
+    param_sets: List[USPParams] = Field(..., min_length=1, max_length=100_000)
+    n_points: int = Field(100, ge=2, le=10_000)
+
+class OptimizeRequest(BaseModel):
+    bounds: Dict[str, Tuple[float, float]] = {}
+    budget: int = Field(2000, ge=1, le=1_000_000)
+    seed: Optional[int] = None
+
+class XRDSample(BaseModel):
+    sample: str
+    two_theta: List[float]
+    intensity: List[float]
+
+class XRDRequest(BaseModel):
+    samples: List[XRDSample] = Field(..., min_length=1)
+
+# Engine calls executed inside pool worker processes
+def _simulate_rows(rows, n_points):
+    batch = USPSimulator().simulate_batch(_columns(rows), n_points=n_points)
+    return {name: values.tolist() for name, values in batch.items()}
+
+def _score_rows(rows):
+    return USPSimulator()._calculate_quality_score(_columns(rows)).tolist()
+
+def _optimize(bounds, budget, seed):
+    return USPSimulator().optimize_parameters(bounds=bounds, budget=budget, seed=seed)
+
+def _analyze_xrd(samples):
+    frame = pd.concat([pd.DataFrame({"Sample": s["sample"], "2Theta": s["two_theta"], "I": s["intensity"]})
+                       for s in samples], ignore_index=True)
+    peaks = XRDAnalyzer().analyze(frame)
+    return peaks.astype(object).where(peaks.notna(), None).to_dict("records")
+
+def _columns(rows):
+    return {name: [row[name] for row in rows] for name in rows[0]}
+
+class MicroBatcher:
+    """Coalesce single requests arriving within ``window`` seconds into one call"""
+    
+    def __init__(self, run_batch, window=0.005, max_batch=1024):
+        self.run_batch = run_batch
+        self.window = window
+        self.max_batch = max_batch
+        self.batches = 0
+        self.items = 0
+        self._pending = []
+        self._flush_task = None
+    
+    async def submit(self, item):
+        future = asyncio.get_running_loop().create_future()
+        self._pending.append((item, future))
+        if len(self._pending) >= self.max_batch:
+            self._flush_now()
+        elif self._flush_task is None:
+            self._flush_task = asyncio.create_task(self._flush_later())
+        return await future
+    
+    async def _flush_later(self):
+        await asyncio.sleep(self.window)
+        self._flush_task = None
+        self._flush_now()
+    
+    def _flush_now(self):
+        pending, self._pending = self._pending, []
+        if pending:
+            asyncio.create_task(self._run(pending))
+    
+    async def _run(self, pending):
+        self.batches += 1
+        self.items += len(pending)
+        try:
+            results = await self.run_batch([item for item, _ in pending])
+        except Exception as exc:
+            for _, future in pending:
+                if not future.done():
+                    future.set_exception(exc)
+            return
+        # Per-item exceptions fail only their own request
+        for (_, future), result in zip(pending, results):
+            if future.done():
+                continue
+            if isinstance(result, Exception):
+                future.set_exception(result)
+            else:
+                future.set_result(result)
+
+class EngineService:
+    """Process pool, admission control and metrics shared by all endpoints"""
+    
+    def __init__(self, workers=None, max_pending=256, batch_window=0.005):
+        self.workers = workers or os.cpu_count() or 1
+        self.max_pending = max_pending
+        self.in_flight = 0
+        self.rejected = 0
+        self.started = time.time()
+        self.latency = RerunProfiler(enabled=True, window=2000)
+        self.pool = None
+        self.score_batcher = MicroBatcher(self._score_batch, window=batch_window)
+        self.simulate_batcher = MicroBatcher(self._simulate_batch, window=batch_window)
+    
+    def start(self):
+        self.pool = ProcessPoolExecutor(max_workers=self.workers)
+    
+    def stop(self):
+        if self.pool is not None:
+            self.pool.shutdown(cancel_futures=True)
+    
+    def admit(self):
+        """Admission control: False once ``max_pending`` requests are in flight"""
+        if self.in_flight >= self.max_pending:
+            self.rejected += 1
+            return False
+        self.in_flight += 1
+        return True
+    
+    def release(self):
+        self.in_flight -= 1
+    
+    async def call(self, func, *args):
+        """Run ``func`` on the process pool"""
+        return await asyncio.get_running_loop().run_in_executor(self.pool, func, *args)
+    
+    async def call_per_row(self, func, rows, split, *args):
+        """Run ``func`` on all rows at once; if that fails, once per row.
+        
+        Returns one result (``split(batch, i)``) or exception per row, so a
+        row the engine rejects does not fail the rows coalesced with it.
+        """
+        try:
+            batch = await self.call(func, rows, *args)
+            return [split(batch, i) for i in range(len(rows))]
+        except Exception as exc:
+            if len(rows) == 1:
+                return [exc]
+        singles = await asyncio.gather(*(self.call(func, [row], *args) for row in rows), return_exceptions=True)
+        return [single if isinstance(single, Exception) else split(single, 0) for single in singles]
+    
+    async def _score_batch(self, rows):
+        return await self.call_per_row(_score_rows, rows, lambda batch, i: batch[i])
+    
+    async def _simulate_batch(self, items):
+        # Coalesced requests share one engine call per distinct resolution
+        results = [None] * len(items)
+        by_points = {}
+        for i, (row, n_points) in enumerate(items):
+            by_points.setdefault(n_points, []).append(i)
+        for n_points, indices in by_points.items():
+            group = await self.call_per_row(_simulate_rows, [items[i][0] for i in indices],
+                                            lambda batch, j: {name: values[j] for name, values in batch.items()},
+                                            n_points)
+            for i, result in zip(indices, group):
+                results[i] = result
+        return results
+    
+    def metrics_text(self):
+        lines = [
+            "# TYPE matai_api_in_flight gauge",
+            f"matai_api_in_flight {self.in_flight}",
+            "# TYPE matai_api_rejected_total counter",
+            f"matai_api_rejected_total {self.rejected}",
+            "# TYPE matai_api_batches_total counter",
+            f'matai_api_batches_total{{batcher="score"}} {self.score_batcher.batches}',
+            f'matai_api_batches_total{{batcher="simulate"}} {self.simulate_batcher.batches}',
+            "# TYPE matai_api_batched_items_total counter",
+            f'matai_api_batched_items_total{{batcher="score"}} {self.score_batcher.items}',
+            f'matai_api_batched_items_total{{batcher="simulate"}} {self.simulate_batcher.items}',
+        ]
+        return "\n".join(lines) + "\n" + self.latency.prometheus_text()
+
+def create_app(workers=None, max_pending=256, batch_window=0.005, max_batch_points=1_000_000):
+    """``max_batch_points`` caps param sets x n_points per batch simulation request"""
+    service = EngineService(workers=workers, max_pending=max_pending, batch_window=batch_window)
+    
+    @asynccontextmanager
+    async def lifespan(app):
+        service.start()
+        yield
+        service.stop()
+    
+    app = FastAPI(title="MatAI Engine API", lifespan=lifespan)
+    app.state.service = service
+    
+    @app.middleware("http")
+    async def admit_and_measure(request: Request, call_next):
+        # Health and metrics stay reachable while the engines are saturated
+        if request.method != "POST":
+            return await call_next(request)
+        if not service.admit():
+            # Drain the body so the keep-alive connection survives the rejection
+            await request.body()
+            return PlainTextResponse("Server busy, retry later", status_code=503, headers={"Retry-After": "1"})
+        start = time.perf_counter()
+        try:
+            return await call_next(request)
+        finally:
+            service.release()
+            route = request.scope.get("route")
+            service.latency.record(route.path if route else "unmatched", (time.perf_counter() - start) * 1000)
+    
+    @app.exception_handler(RequestValidationError)
+    async def validation_error(request: Request, exc: RequestValidationError):
+        # Echoed inputs may hold NaN or infinity, which JSON cannot carry
+        errors = [{key: value for key, value in error.items() if key not in ("input", "ctx")}
+                  for error in exc.errors()]
+        return JSONResponse({"detail": errors}, status_code=422)
+    
+    @app.get("/health")
+    async def health():
+        return {"status": "ok", "workers": service.workers, "in_flight": service.in_flight,
+                "max_pending": service.max_pending, "uptime_s": round(time.time() - service.started, 1)}
+    
+    @app.get("/metrics", response_class=PlainTextResponse)
+    async def metrics():
+        return service.metrics_text()
+    
+    @app.post("/usp/simulate")
+    async def simulate(request: SimulateRequest):
+        try:
+            return await service.simulate_batcher.submit((request.params.model_dump(), request.n_points))
+        except REJECTED_INPUT as exc:
+            raise HTTPException(422, str(exc))
+    
+    @app.post("/usp/simulate_batch")
+    async def simulate_batch(request: BatchRequest):
+        # Admission control counts requests, so bound the work a single one can carry
+        points = len(request.param_sets) * request.n_points
+        if points > max_batch_points:
+            raise HTTPException(422, f"param_sets x n_points is {points:,}; the limit is {max_batch_points:,}")
+        rows = [params.model_dump() for params in request.param_sets]
+        try:
+            return await service.call(_simulate_rows, rows, request.n_points)
+        except REJECTED_INPUT as exc:
+            raise HTTPException(422, str(exc))
+    
+    @app.post("/usp/quality")
+    async def quality(params: USPParams):
+        return {"quality": await service.score_batcher.submit(params.model_dump())}
+    
+    @app.post("/usp/quality_batch")
+    async def quality_batch(request: BatchRequest):
+        return {"quality": await service.call(_score_rows, [p.model_dump() for p in request.param_sets])}
+    
+    @app.post("/usp/optimize")
+    async def optimize(request: OptimizeRequest):
+        unknown = set(request.bounds) - set(USPSimulator().default_params)
+        if unknown:
+            raise HTTPException(422, f"Unknown parameters in bounds: {sorted(unknown)}")
+        try:
+            return await service.call(_optimize, request.bounds, request.budget, request.seed)
+        except ValueError as exc:
+            raise HTTPException(422, str(exc))
+    
+    @app.post("/xrd/analyze")
+    async def analyze_xrd(request: XRDRequest):
+        for sample in request.samples:
+            if len(sample.two_theta) != len(sample.intensity):
+                raise HTTPException(422, f"{sample.sample}: two_theta and intensity lengths differ")
+        return {"peaks": await service.call(_analyze_xrd, [s.model_dump() for s in request.samples])}
+    
+    return app
+
+app = create_app(workers=int(os.environ.get("MATAI_API_WORKERS", 0)) or None,
+                 max_pending=int(os.environ.get("MATAI_API_MAX_PENDING", 256)),
+                 max_batch_points=int(os.environ.get("MATAI_API_MAX_BATCH_POINTS", 1_000_000)))
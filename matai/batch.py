@@ -0,0 +1,167 @@
+"""Resumable process-pool runner for headless XRD and USP batch jobs."""
+import hashlib
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from pathlib import Path
+
+from matai._lazy import LazyModule
+from matai.usp import USPSimulator
+from matai.xrd import XRDAnalyzer, read_scan_frame
+
+pd = LazyModule("pandas")
+
+class BatchTaskError(RuntimeError):
+    """Raised at the end of a run in which some items failed; the rest were merged"""
+    
+    def __init__(self, message, results_path, errors_path):
+        super().__init__(message)
+        self.results_path = results_path
+        self.errors_path = errors_path
+
+class BatchRunner:
+    """Fan tasks out over a process pool and stream each result to disk.
+    
+    Every task writes ``part-NNNNN.csv`` into ``output_dir`` as soon as it
+    completes (via a temp file and rename, so parts are never half-written).
+    A ``manifest.json`` records the task list; rerunning the same job skips
+    tasks whose part already exists, which resumes an interrupted run.
+    
+    Tasks are lists of items. When a task fails, each of its items is
+    retried on its own; the items that succeed still make up its part and
+    the failures are listed in ``errors.csv``. The run carries on and
+    raises ``BatchTaskError`` once everything is merged. Tasks with
+    recorded failures run again on resume.
+    """
+    
+    def __init__(self, output_dir, workers=None, log=print):
+        self.output_dir = Path(output_dir)
+        self.workers = workers or os.cpu_count() or 1
+        self.log = log
+    
+    def run(self, job, worker, tasks, restart=False):
+        """Run ``worker(payload)`` for each task and merge the parts into results.csv"""
+        self.output_dir.mkdir(parents=True, exist_ok=True)
+        manifest_path = self.output_dir / "manifest.json"
+        digest = hashlib.sha1("\0".join(repr(payload) for payload in tasks).encode("utf-8")).hexdigest()
+        manifest = {"job": job, "tasks": len(tasks), "digest": digest}
+        if manifest_path.exists() and not restart:
+            previous = json.loads(manifest_path.read_text())
+            if previous != manifest:
+                raise ValueError(f"{self.output_dir} holds a different job; use --restart to overwrite it")
+        else:
+            for part in self.output_dir.glob("part-*.csv"):
+                part.unlink()
+            self._errors_path.unlink(missing_ok=True)
+            manifest_path.write_text(json.dumps(manifest))
+        
+        retry = self._failed_tasks()
+        pending = [i for i in range(len(tasks)) if i in retry or not self._part_path(i).exists()]
+        self.log(f"{job}: {len(tasks) - len(pending)}/{len(tasks)} tasks already done, "
+                 f"running {len(pending)} on {self.workers} workers")
+        errors = []
+        if pending:
+            with ProcessPoolExecutor(max_workers=self.workers) as pool:
+                futures = {pool.submit(worker, tasks[i]): i for i in pending}
+                failed = []
+                for done, future in enumerate(as_completed(futures), 1):
+                    i = futures[future]
+                    try:
+                        frame = future.result()
+                    except Exception as exc:
+                        failed.append(i)
+                        self.log(f"{job}: task {i} failed ({exc}), retrying its items one by one")
+                        continue
+                    self._write_part(i, frame)
+                    self.log(f"{job}: task {i} done ({done}/{len(pending)})")
+                if failed:
+                    errors = self._run_items(job, pool, worker, tasks, failed)
+        
+        self._write_errors(errors)
+        results_path = self._merge(len(tasks))
+        if errors:
+            raise BatchTaskError(f"{job}: {len(errors)} item(s) failed, see {self._errors_path}; "
+                                 f"the other results are in {results_path}", results_path, self._errors_path)
+        return results_path
+    
+    def _run_items(self, job, pool, worker, tasks, failed):
+        """Rerun each item of the failed tasks alone; write what succeeds and return the failures"""
+        futures = {pool.submit(worker, [item]): (i, position)
+                   for i in failed for position, item in enumerate(tasks[i])}
+        frames = {i: {} for i in failed}
+        errors = []
+        for future in as_completed(futures):
+            i, position = futures[future]
+            try:
+                frames[i][position] = future.result()
+            except Exception as exc:
+                errors.append({"task": i, "item": str(tasks[i][position]), "error": f"{type(exc).__name__}: {exc}"})
+                self.log(f"{job}: task {i} item {tasks[i][position]} failed: {exc}")
+        for i, parts in frames.items():
+            ordered = [parts[position] for position in sorted(parts)]
+            self._write_part(i, pd.concat(ordered, ignore_index=True) if ordered else pd.DataFrame())
+        return sorted(errors, key=lambda error: error["task"])
+    
+    @property
+    def _errors_path(self):
+        return self.output_dir / "errors.csv"
+    
+    def _failed_tasks(self):
+        if not self._errors_path.exists():
+            return set()
+        return set(pd.read_csv(self._errors_path)["task"])
+    
+    def _write_errors(self, errors):
+        if not errors:
+            self._errors_path.unlink(missing_ok=True)
+            return
+        tmp_path = self._errors_path.with_suffix(".tmp")
+        pd.DataFrame(errors, columns=["task", "item", "error"]).to_csv(tmp_path, index=False)
+        os.replace(tmp_path, self._errors_path)
+    
+    def _part_path(self, i):
+        return self.output_dir / f"part-{i:05d}.csv"
+    
+    def _write_part(self, i, frame):
+        tmp_path = self._part_path(i).with_suffix(".tmp")
+        frame.to_csv(tmp_path, index=False)
+        os.replace(tmp_path, self._part_path(i))
+    
+    def _merge(self, n_tasks):
+        results_path = self.output_dir / "results.csv"
+        with open(results_path, "w") as out:
+            header_written = False
+            for i in range(n_tasks):
+                with open(self._part_path(i)) as part:
+                    header = part.readline()
+                    if not header.strip():
+                        continue
+                    if not header_written:
+                        out.write(header)
+                        header_written = True
+                    for line in part:
+                        out.write(line)
+        return results_path
+
+def chunked(items, size):
+    return [items[start:start + size] for start in range(0, len(items), size)]
+
+def analyze_scan_files(paths):
+    """Worker: run peak analysis over a chunk of raw scan files"""
+    analyzer = XRDAnalyzer()
+    frames = []
+    for path in paths:
+        peaks = analyzer.analyze(read_scan_frame(path))
+        peaks.insert(0, "File", str(path))
+        frames.append(peaks)
+    return pd.concat(frames, ignore_index=True) if frames else pd.DataFrame()
+
+def simulate_parameter_rows(records):
+    """Worker: simulate a chunk of USP parameter rows in one batch pass"""
+    params = pd.DataFrame.from_records(records)
+    batch = USPSimulator().simulate_batch(params)
+    params["final_thickness"] = batch["thickness"][:, -1]
+    params["final_crystallinity"] = batch["crystallinity"][:, -1]
+    params["final_roughness"] = batch["roughness"][:, -1]
+    params["final_quality"] = batch["final_quality"]
+    return params
@@ -0,0 +1,79 @@
+"""Answer cache shared by the Think Tank and chat assistant."""
+import hashlib
+import re
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+class ResponseCache:
+    """Bounded LRU answer cache with TTL and an optional shared SQLite tier.
+    
+    The in-memory tier is per process; when ``db_path`` is set, entries are
+    also written to SQLite (WAL mode) so other Streamlit sessions and
+    processes can reuse them. Hits, misses and evictions are counted.
+    """
+    
+    def __init__(self, max_entries=512, ttl=3600, db_path=None):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.stats = {"hits": 0, "disk_hits": 0, "misses": 0, "evictions": 0}
+        self._db = None
+        if db_path:
+            self._db = sqlite3.connect(db_path, check_same_thread=False, timeout=5)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute("CREATE TABLE IF NOT EXISTS responses "
+                             "(key TEXT PRIMARY KEY, value TEXT NOT NULL, expires REAL NOT NULL)")
+            self._db.commit()
+    
+    @staticmethod
+    def make_key(question, *context):
+        """Key on the normalized question plus a fingerprint of the answer context"""
+        normalized = " ".join(re.sub(r"[^\w\s]", " ", question.lower()).split())
+        digest = hashlib.sha1(normalized.encode("utf-8"))
+        for part in context:
+            digest.update(b"\0" + str(part).encode("utf-8"))
+        return digest.hexdigest()
+    
+    def get(self, key):
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] > now:
+                self._entries.move_to_end(key)
+                self.stats["hits"] += 1
+                return entry[1]
+            if entry is not None:
+                del self._entries[key]
+            if self._db is not None:
+                row = self._db.execute("SELECT value, expires FROM responses WHERE key = ? AND expires > ?",
+                                       (key, now)).fetchone()
+                if row is not None:
+                    self.stats["disk_hits"] += 1
+                    self._remember(key, row[0], row[1])
+                    return row[0]
+            self.stats["misses"] += 1
+            return None
+    
+    def put(self, key, value):
+        expires = time.time() + self.ttl
+        with self._lock:
+            self._remember(key, value, expires)
+            if self._db is not None:
+                self._db.execute("INSERT OR REPLACE INTO responses (key, value, expires) VALUES (?, ?, ?)",
+                                 (key, value, expires))
+                self._db.execute("DELETE FROM responses WHERE expires <= ?", (time.time(),))
+                self._db.commit()
+    
+    def _remember(self, key, value, expires):
+        self._entries[key] = (expires, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.stats["evictions"] += 1
+    
+    def snapshot(self):
+        with self._lock:
+            return {**self.stats, "entries": len(self._entries)}
@@ -0,0 +1,153 @@
+"""Headless command-line entry point: ``python -m matai``.
+
+Examples:
+    python -m matai xrd scans/ --output-dir runs/xrd-2024-06 --workers 8 --chunk-size 4
+    python -m matai usp sweep.csv --output-dir runs/sweep --chunk-size 5000
+    python -m matai lattice dataset/xrd_zno_zno-mg.csv --system hexagonal --output lattice.csv
+    python -m matai mc --samples 5000000 --workers 8 --seed 42 --param temperature=460 --tolerance temperature=3
+    python -m matai serve --port 8000 --workers 4
+
+The batch commands reuse the engine code behind the Streamlit app without
+importing Streamlit. Results stream to ``part-*.csv`` files as tasks
+finish and are merged into ``results.csv``. Rerunning an interrupted
+command with the same arguments resumes it. Inputs that fail are listed
+in ``errors.csv``, the rest of the run still completes, and the command
+exits with status 1.
+"""
+import argparse
+import json
+import sys
+from pathlib import Path
+
+from matai._lazy import LazyModule
+from matai.batch import BatchRunner, BatchTaskError, analyze_scan_files, chunked, simulate_parameter_rows
+from matai.usp import USPSimulator
+from matai.xrd import SCAN_BINARY_SUFFIXES, SCAN_TEXT_SUFFIXES, LatticeRefiner, XRDAnalyzer
+
+pd = LazyModule("pandas")
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog="python -m matai", description="MatAI batch processing")
+    commands = parser.add_subparsers(dest="command", required=True)
+    
+    def add_runner_options(command, default_chunk):
+        command.add_argument("--output-dir", type=Path, required=True, help="directory for parts and results.csv")
+        command.add_argument("--workers", type=int, default=None, help="process count (default: CPU count)")
+        command.add_argument("--chunk-size", type=int, default=default_chunk, help="items per task")
+        command.add_argument("--restart", action="store_true", help="discard progress from a previous run")
+    
+    xrd = commands.add_parser("xrd", help="peak analysis over a directory of raw scans")
+    xrd.add_argument("input_dir", type=Path)
+    xrd.add_argument("--pattern", default="**/*", help="glob for scan files (default: recursive)")
+    add_runner_options(xrd, default_chunk=4)
+    
+    usp = commands.add_parser("usp", help="USP simulation over a parameter table (CSV)")
+    usp.add_argument("params_csv", type=Path)
+    add_runner_options(usp, default_chunk=5000)
+    
+    lattice = commands.add_parser("lattice", help="least-squares lattice parameters from indexed reflection tables")
+    lattice.add_argument("tables", type=Path, nargs="+", help="CSV files with Sample, H, K, L and 2Theta columns")
+    lattice.add_argument("--system", choices=sorted(LatticeRefiner.SYSTEMS), default="hexagonal")
+    lattice.add_argument("--source", choices=["2theta", "d_hkl"], default="2theta", help="observed spacings to fit")
+    lattice.add_argument("--wavelength", type=float, default=XRDAnalyzer.WAVELENGTH,
+                         help="Angstrom (default Cu K-alpha)")
+    lattice.add_argument("--output", type=Path, help="write the per-sample lattice table here (CSV)")
+    lattice.add_argument("--reflections", type=Path, help="write per-reflection residuals here (CSV)")
+    
+    mc = commands.add_parser("mc", help="Monte Carlo quality uncertainty for one USP operating point")
+    mc.add_argument("--samples", type=int, default=1_000_000)
+    mc.add_argument("--chunk-size", type=int, default=65_536)
+    mc.add_argument("--workers", type=int, default=1, help="processes scoring chunks (results do not depend on it)")
+    mc.add_argument("--seed", type=int, default=None)
+    mc.add_argument("--param", action="append", default=[], metavar="NAME=VALUE", help="nominal value override")
+    mc.add_argument("--tolerance", action="append", default=[], metavar="NAME=SIGMA", help="1-sigma drift override")
+    
+    serve = commands.add_parser("serve", help="run the HTTP engine API (needs requirements-api.txt)")
+    serve.add_argument("--host", default="127.0.0.1")
+    serve.add_argument("--port", type=int, default=8000)
+    serve.add_argument("--workers", type=int, default=None, help="engine process count (default: CPU count)")
+    serve.add_argument("--max-pending", type=int, default=256, help="in-flight requests before returning 503")
+    return parser
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    if args.command == "serve":
+        return serve(args)
+    if args.command == "mc":
+        return monte_carlo(args)
+    if args.command == "lattice":
+        return refine_lattice(args)
+    
+    runner = BatchRunner(args.output_dir, workers=args.workers, log=lambda message: print(message, file=sys.stderr))
+    if args.chunk_size < 1:
+        raise SystemExit("--chunk-size must be at least 1")
+    
+    try:
+        results = run_command(args, runner)
+    except BatchTaskError as exc:
+        print(exc.results_path)
+        print(exc, file=sys.stderr)
+        return 1
+    except ValueError as exc:
+        raise SystemExit(str(exc))
+    print(results)
+    return 0
+
+def serve(args):
+    try:
+        import uvicorn
+        from matai.api import create_app
+    except ImportError as exc:
+        raise SystemExit(f"{exc}; install the API extras with: pip install -r requirements-api.txt")
+    uvicorn.run(create_app(workers=args.workers, max_pending=args.max_pending), host=args.host, port=args.port)
+    return 0
+
+def monte_carlo(args):
+    def assignments(items, flag):
+        values = {}
+        for item in items:
+            name, _, value = item.partition("=")
+            try:
+                values[name] = float(value)
+            except ValueError:
+                raise SystemExit(f"{flag} expects NAME=NUMBER, got {item!r}")
+        return values
+    
+    try:
+        result = USPSimulator().propagate_uncertainty(
+            assignments(args.param, "--param"), assignments(args.tolerance, "--tolerance"),
+            n_samples=args.samples, chunk_size=args.chunk_size, seed=args.seed, workers=args.workers)
+    except ValueError as exc:
+        raise SystemExit(str(exc))
+    result.pop("histogram")
+    print(json.dumps(result, indent=2))
+    return 0
+
+def refine_lattice(args):
+    table = pd.concat([pd.read_csv(path) for path in args.tables], ignore_index=True)
+    try:
+        lattice, reflections = LatticeRefiner(args.system, wavelength=args.wavelength).refine(table, source=args.source)
+    except ValueError as exc:
+        raise SystemExit(str(exc))
+    if args.reflections:
+        reflections.to_csv(args.reflections, index=False)
+    if args.output:
+        lattice.to_csv(args.output, index=False)
+    else:
+        print(lattice.to_string(index=False))
+    return 0
+
+def run_command(args, runner):
+    if args.command == "xrd":
+        suffixes = SCAN_TEXT_SUFFIXES | SCAN_BINARY_SUFFIXES
+        paths = sorted(str(p) for p in args.input_dir.glob(args.pattern)
+                       if p.is_file() and p.suffix.lower() in suffixes)
+        if not paths:
+            raise SystemExit(f"No scan files matching {args.pattern} in {args.input_dir}")
+        return runner.run("xrd", analyze_scan_files, chunked(paths, args.chunk_size), restart=args.restart)
+    else:
+        params = pd.read_csv(args.params_csv)
+        params.insert(0, "row", range(len(params)))
+        records = params.to_dict("records")
+        return runner.run("usp", simulate_parameter_rows, chunked(records, args.chunk_size),
+                          restart=args.restart)
@@ -0,0 +1,111 @@
+"""Persistent chat history with a bounded in-memory window per session."""
+import sqlite3
+import threading
+import time
+import uuid
+from collections import deque
+
+class ChatHistoryStore:
+    """Append-only SQLite message log keyed by conversation id.
+    
+    One connection (WAL mode) is shared by all Streamlit sessions in the
+    process. Messages are read back in pages, newest first, via the
+    ``(conversation, id)`` index, so rendering cost does not depend on the
+    conversation length. ``max_messages`` caps what is kept on disk per
+    conversation.
+    """
+    
+    def __init__(self, db_path, max_messages=5000):
+        self.max_messages = max_messages
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(db_path, check_same_thread=False, timeout=5)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("CREATE TABLE IF NOT EXISTS chat_messages "
+                         "(id INTEGER PRIMARY KEY AUTOINCREMENT, conversation TEXT NOT NULL, "
+                         "role TEXT NOT NULL, content TEXT NOT NULL, created REAL NOT NULL)")
+        self._db.execute("CREATE INDEX IF NOT EXISTS chat_messages_conversation "
+                         "ON chat_messages (conversation, id)")
+        self._db.commit()
+    
+    @staticmethod
+    def new_conversation_id():
+        return uuid.uuid4().hex
+    
+    def append(self, conversation, role, content):
+        with self._lock:
+            cursor = self._db.execute("INSERT INTO chat_messages (conversation, role, content, created) "
+                                      "VALUES (?, ?, ?, ?)", (conversation, role, content, time.time()))
+            self._db.execute("DELETE FROM chat_messages WHERE conversation = ? AND id <= "
+                             "(SELECT id FROM chat_messages WHERE conversation = ? "
+                             "ORDER BY id DESC LIMIT 1 OFFSET ?)",
+                             (conversation, conversation, self.max_messages))
+            self._db.commit()
+            return cursor.lastrowid
+    
+    def page(self, conversation, limit, before_id=None):
+        """Up to ``limit`` messages older than ``before_id``, oldest first"""
+        with self._lock:
+            rows = self._db.execute("SELECT id, role, content FROM chat_messages "
+                                    "WHERE conversation = ? AND id < ? ORDER BY id DESC LIMIT ?",
+                                    (conversation, before_id if before_id is not None else 2 ** 63 - 1,
+                                     limit)).fetchall()
+        return [{"id": row[0], "role": row[1], "content": row[2]} for row in reversed(rows)]
+    
+    def count(self, conversation, before_id=None):
+        with self._lock:
+            return self._db.execute("SELECT COUNT(*) FROM chat_messages WHERE conversation = ? AND id < ?",
+                                    (conversation, before_id if before_id is not None else 2 ** 63 - 1)
+                                    ).fetchone()[0]
+    
+    def clear(self, conversation):
+        with self._lock:
+            self._db.execute("DELETE FROM chat_messages WHERE conversation = ?", (conversation,))
+            self._db.commit()
+
+class ChatSession:
+    """Recent-message window for one conversation, kept in session state.
+    
+    At most ``window`` messages and ``max_chars`` characters stay in
+    memory; older messages are only read from the store when the user asks
+    for earlier pages, and are not retained between reruns.
+    """
+    
+    def __init__(self, store, conversation, window=40, max_chars=100_000):
+        self.store = store
+        self.conversation = conversation
+        self.max_chars = max_chars
+        self.recent = deque(store.page(conversation, window), maxlen=window)
+        self.chars = sum(len(message["content"]) for message in self.recent)
+        self._trim()
+    
+    def append(self, role, content):
+        message_id = self.store.append(self.conversation, role, content)
+        if len(self.recent) == self.recent.maxlen:
+            self.chars -= len(self.recent[0]["content"])
+        self.recent.append({"id": message_id, "role": role, "content": content})
+        self.chars += len(content)
+        self._trim()
+    
+    def _trim(self):
+        # Always keep the newest message, even if it alone exceeds the cap
+        while len(self.recent) > 1 and self.chars > self.max_chars:
+            self.chars -= len(self.recent.popleft()["content"])
+    
+    def visible(self, earlier=0):
+        """The in-memory window plus ``earlier`` older messages from the store"""
+        messages = list(self.recent)
+        if earlier > 0:
+            before_id = messages[0]["id"] if messages else None
+            messages = self.store.page(self.conversation, earlier, before_id) + messages
+        return messages
+    
+    def remaining_before(self, messages):
+        """Number of stored messages older than the first of ``messages``"""
+        if not messages:
+            return 0
+        return self.store.count(self.conversation, messages[0]["id"])
+    
+    def clear(self):
+        self.store.clear(self.conversation)
+        self.recent.clear()
+        self.chars = 0
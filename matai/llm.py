@@ -0,0 +1,140 @@
+"""Pooled client for OpenAI-compatible model endpoints."""
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from matai._lazy import LazyModule
+
+# Only needed once a model endpoint is configured
+requests = LazyModule("requests")
+
+class ModelClientError(RuntimeError):
+    """Raised when the model endpoint fails after the retry budget is spent"""
+
+class ModelClient:
+    """Pooled, concurrency-bounded client for an OpenAI-compatible API.
+    
+    One keep-alive ``requests.Session`` is shared by all callers, a
+    semaphore caps in-flight requests against the model server, and each
+    call retries transient failures (connection errors, 429, 5xx) with
+    exponential backoff until ``retry_budget`` seconds have elapsed.
+    """
+    RETRY_STATUS = {429, 500, 502, 503, 504}
+    
+    def __init__(self, base_url, model="Qwen/QwQ-32B", api_key=None, max_concurrent=8,
+                 connect_timeout=3.05, read_timeout=60, max_retries=3, retry_budget=30,
+                 backoff=0.5, supports_batch=False):
+        self.base_url = base_url.rstrip("/")
+        self.model = model
+        self.max_retries = max_retries
+        self.retry_budget = retry_budget
+        self.backoff = backoff
+        self.timeout = (connect_timeout, read_timeout)
+        self.supports_batch = supports_batch
+        self.max_concurrent = max_concurrent
+        self._slots = threading.BoundedSemaphore(max_concurrent)
+        
+        self.session = requests.Session()
+        adapter = requests.adapters.HTTPAdapter(pool_connections=1, pool_maxsize=max_concurrent,
+                                                pool_block=True)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self.session.headers["Content-Type"] = "application/json"
+        if api_key:
+            self.session.headers["Authorization"] = f"Bearer {api_key}"
+    
+    @classmethod
+    def from_env(cls):
+        """Build a client from ``MATAI_LLM_*`` environment variables, or return None"""
+        base_url = os.environ.get("MATAI_LLM_BASE_URL")
+        if not base_url:
+            return None
+        return cls(
+            base_url,
+            model=os.environ.get("MATAI_LLM_MODEL", "Qwen/QwQ-32B"),
+            api_key=os.environ.get("MATAI_LLM_API_KEY"),
+            max_concurrent=int(os.environ.get("MATAI_LLM_MAX_CONCURRENT", 8)),
+            supports_batch=os.environ.get("MATAI_LLM_BATCH", "0") == "1"
+        )
+    
+    def _post(self, path, payload, stream=False):
+        """POST with a retry/time budget; callers hold a concurrency slot"""
+        deadline = time.monotonic() + self.retry_budget
+        attempt = 0
+        while True:
+            try:
+                response = self.session.post(f"{self.base_url}{path}", json=payload,
+                                             timeout=self.timeout, stream=stream)
+                if response.status_code not in self.RETRY_STATUS:
+                    response.raise_for_status()
+                    return response
+                error = ModelClientError(f"{path} returned HTTP {response.status_code}")
+                response.close()
+            except (requests.ConnectionError, requests.Timeout) as exc:
+                error = ModelClientError(f"{path} failed: {exc}")
+            except requests.HTTPError as exc:
+                raise ModelClientError(f"{path} failed: {exc}") from exc
+            
+            attempt += 1
+            delay = self.backoff * 2 ** (attempt - 1)
+            if attempt > self.max_retries or time.monotonic() + delay > deadline:
+                raise error
+            time.sleep(delay)
+    
+    @staticmethod
+    def _decode(path, response, extract):
+        """Apply ``extract`` to a JSON body, reporting transport or shape errors as ModelClientError"""
+        try:
+            return extract(response.json())
+        except requests.RequestException as exc:
+            raise ModelClientError(f"{path} failed while reading the response: {exc}") from exc
+        except (ValueError, LookupError, TypeError, AttributeError) as exc:
+            raise ModelClientError(f"{path} returned an unexpected body: {exc!r}") from exc
+    
+    def chat(self, messages, **options):
+        """Return the full assistant message for one chat completion"""
+        payload = {"model": self.model, "messages": messages, **options}
+        with self._slots:
+            response = self._post("/chat/completions", payload)
+            return self._decode("/chat/completions", response, lambda data: data["choices"][0]["message"]["content"])
+    
+    def stream_chat(self, messages, cancel_event=None, **options):
+        """Yield content deltas of a streamed chat completion (server-sent events)"""
+        payload = {"model": self.model, "messages": messages, "stream": True, **options}
+        # The slot stays held while the body streams so open connections stay bounded
+        with self._slots, self._post("/chat/completions", payload, stream=True) as response:
+            # Failures after the headers arrive (dropped connection, read timeout, bad event) surface
+            # as ModelClientError like failures before them
+            try:
+                for line in response.iter_lines(decode_unicode=True):
+                    if cancel_event is not None and cancel_event.is_set():
+                        return
+                    if not line or not line.startswith("data:"):
+                        continue
+                    data = line[len("data:"):].strip()
+                    if data == "[DONE]":
+                        return
+                    delta = json.loads(data)["choices"][0].get("delta", {})
+                    if delta.get("content"):
+                        yield delta["content"]
+            except requests.RequestException as exc:
+                raise ModelClientError(f"/chat/completions stream failed: {exc}") from exc
+            except (ValueError, LookupError, TypeError, AttributeError) as exc:
+                raise ModelClientError(f"/chat/completions sent a malformed event: {exc!r}") from exc
+    
+    def complete_batch(self, prompts, **options):
+        """Complete many prompts, in one request when the server accepts prompt lists"""
+        if self.supports_batch:
+            payload = {"model": self.model, "prompt": list(prompts), **options}
+            with self._slots:
+                choices = self._decode("/completions", self._post("/completions", payload),
+                                       lambda data: data["choices"])
+            return [choice["text"] for choice in sorted(choices, key=lambda c: c["index"])]
+        with ThreadPoolExecutor(max_workers=self.max_concurrent) as pool:
+            return list(pool.map(
+                lambda prompt: self.chat([{"role": "user", "content": prompt}], **options), prompts))
+    
+    def close(self):
+        self.session.close()
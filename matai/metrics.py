@@ -0,0 +1,131 @@
+"""Shared background metrics feed for the real-time dashboard."""
+import csv
+import json
+import random
+import sqlite3
+import threading
+import time
+from pathlib import Path
+
+class StubMetricsSource:
+    """Bounded random walk over the dashboard's headline metrics, for demos and development"""
+    RANGES = {
+        "global_research_activity": (850, 1200),
+        "ai_discoveries_today": (15, 45),
+        "active_labs": (2500, 3500),
+        "new_patents": (25, 85)
+    }
+    
+    def __init__(self, seed=None, volatility=0.03):
+        self._rng = random.Random(seed)
+        self.volatility = volatility
+        self._values = {name: self._rng.uniform(low, high) for name, (low, high) in self.RANGES.items()}
+    
+    def read(self):
+        for name, (low, high) in self.RANGES.items():
+            step = self._rng.gauss(0, self.volatility * (high - low))
+            self._values[name] = min(high, max(low, self._values[name] + step))
+        return {name: round(value) for name, value in self._values.items()}
+
+class FileMetricsSource:
+    """Metrics from a local JSON object or a ``name,value`` CSV, re-read when the file changes"""
+    
+    def __init__(self, path):
+        self.path = Path(path)
+        self._stamp = None
+        self._values = {}
+    
+    def read(self):
+        stat = self.path.stat()
+        stamp = (stat.st_size, stat.st_mtime_ns)
+        if stamp != self._stamp:
+            if self.path.suffix.lower() == ".csv":
+                with open(self.path, newline="") as handle:
+                    # Later rows win, so an appended log reads as its latest values
+                    self._values = {row["name"]: float(row["value"]) for row in csv.DictReader(handle)}
+            else:
+                with open(self.path) as handle:
+                    self._values = {name: float(value) for name, value in json.load(handle).items()}
+            self._stamp = stamp
+        return dict(self._values)
+
+class SQLiteMetricsSource:
+    """Metrics from a query returning ``(name, value)`` rows of a local SQLite database"""
+    DEFAULT_QUERY = "SELECT name, value FROM dashboard_metrics"
+    
+    def __init__(self, db_path, query=DEFAULT_QUERY):
+        self.db_path = Path(db_path)
+        self.query = query
+    
+    def read(self):
+        # Read-only connection per poll; polls only happen on the feed thread
+        db = sqlite3.connect(f"{self.db_path.resolve().as_uri()}?mode=ro", uri=True, timeout=5)
+        try:
+            return {str(name): float(value) for name, value in db.execute(self.query)}
+        finally:
+            db.close()
+
+def open_metrics_source(spec="stub"):
+    """Source for ``"stub"``, ``"sqlite:PATH"`` or a JSON/CSV file path"""
+    if spec == "stub":
+        return StubMetricsSource()
+    if spec.startswith("sqlite:"):
+        return SQLiteMetricsSource(spec[len("sqlite:"):])
+    return FileMetricsSource(spec)
+
+class MetricsFeed:
+    """One background producer per process behind a shared metrics snapshot.
+    
+    A daemon thread polls ``source.read()`` every ``interval`` seconds and
+    swaps in a new immutable snapshot (values, change since the previous
+    poll, timestamp). Readers only take a reference to the current
+    snapshot, so the cost of serving the dashboard does not depend on the
+    number of sessions reading it. A failing source keeps the last good
+    values and records the error.
+    """
+    
+    def __init__(self, source, interval=5.0):
+        self.source = source
+        self.interval = interval
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        self._snapshot = {"metrics": {}, "deltas": {}, "updated": None, "refreshes": 0, "error": None}
+    
+    def start(self):
+        """Take a first reading synchronously, then keep refreshing in the background"""
+        with self._lock:
+            if self._thread is not None:
+                return self
+            self._thread = threading.Thread(target=self._run, name="matai-metrics-feed", daemon=True)
+        self.refresh()
+        self._thread.start()
+        return self
+    
+    def stop(self, timeout=None):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+    
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.refresh()
+    
+    def refresh(self):
+        previous = self._snapshot
+        try:
+            metrics = self.source.read()
+        except Exception as exc:
+            snapshot = dict(previous, error=f"{type(exc).__name__}: {exc}")
+        else:
+            deltas = {name: value - previous["metrics"][name] if name in previous["metrics"] else None
+                      for name, value in metrics.items()}
+            snapshot = {"metrics": metrics, "deltas": deltas, "updated": time.time(),
+                        "refreshes": previous["refreshes"] + 1, "error": None}
+        with self._lock:
+            self._snapshot = snapshot
+        return snapshot
+    
+    def snapshot(self):
+        with self._lock:
+            return self._snapshot
@@ -0,0 +1,268 @@
+"""Reference-library XRD phase identification over a memory-mapped pattern index."""
+import hashlib
+import json
+import os
+from pathlib import Path
+
+import numpy as np
+
+from matai._lazy import LazyModule
+
+pd = LazyModule("pandas")
+
+# Approximate powder reference cards for Cu K-alpha: phase -> [(2theta, relative intensity)].
+# Film phases, dopant by-products and common substrates; extend with CSVs in dataset/phases/.
+REFERENCE_PHASES = {
+    "ZnO (wurtzite)": [(31.77, 57), (34.42, 44), (36.25, 100), (47.54, 23), (56.60, 32), (62.86, 29),
+                       (66.38, 4), (67.96, 23), (69.10, 11), (72.56, 2), (76.95, 4), (81.37, 1), (89.61, 7)],
+    "MgO (periclase)": [(36.94, 4), (42.92, 100), (62.30, 52), (74.69, 5), (78.63, 12)],
+    "Zn (metal)": [(36.30, 53), (38.99, 40), (43.23, 100), (54.34, 28), (70.06, 25), (70.66, 21),
+                   (82.10, 23)],
+    "Mg(OH)2 (brucite)": [(18.59, 90), (32.84, 10), (37.98, 100), (50.85, 55), (58.64, 35), (62.07, 14),
+                          (68.24, 18)],
+    "ZnAl2O4 (gahnite)": [(31.24, 84), (36.84, 100), (44.80, 8), (55.64, 22), (59.34, 43), (65.24, 47),
+                          (77.30, 6)],
+    "SnO2 (cassiterite, FTO)": [(26.61, 100), (33.89, 75), (37.95, 21), (51.78, 57), (54.76, 14),
+                                (57.82, 6), (61.87, 11), (64.72, 11), (65.94, 13), (78.71, 8)],
+    "In2O3 (bixbyite, ITO)": [(21.50, 14), (30.58, 100), (35.47, 30), (41.85, 8), (45.69, 12), (51.04, 35),
+                              (60.68, 25)],
+    "Si (substrate)": [(28.44, 100), (47.30, 55), (56.12, 30), (69.13, 6), (76.38, 11), (88.03, 12)],
+}
+
+def builtin_references():
+    """The bundled reference cards as (phase, two_theta, intensity) tuples"""
+    return [(name, np.array([p[0] for p in peaks]), np.array([p[1] for p in peaks], dtype=np.float64))
+            for name, peaks in REFERENCE_PHASES.items()]
+
+def read_reference_library(path):
+    """Read reference patterns from a CSV file or a directory of CSV files.
+    
+    Each file is a long table with ``2Theta`` and ``I`` columns; a ``Phase``
+    column holds several references per file, otherwise the file stem names
+    the phase.
+    """
+    path = Path(path)
+    paths = sorted(path.glob("*.csv")) if path.is_dir() else [path]
+    references = []
+    for csv_path in paths:
+        table = pd.read_csv(csv_path)
+        if "Phase" not in table:
+            table.insert(0, "Phase", csv_path.stem)
+        for phase, group in table.groupby("Phase", sort=False):
+            references.append((str(phase), group["2Theta"].to_numpy(dtype=np.float64),
+                               group["I"].to_numpy(dtype=np.float64)))
+    return references
+
+class PhaseIndex:
+    """Fixed-grid matrix index over reference diffraction patterns.
+    
+    Every reference is rendered onto one 2θ grid as Gaussian-broadened
+    peaks and L2-normalized, giving a float32 row per phase. The matrix is
+    persisted as a plain ``.npy`` and memory-mapped on load, so startup
+    does not depend on the library size. Queries are vectorized the same
+    way and scored against all rows with one matrix product per block;
+    shift tolerance scores stacked shifted copies of each query in the
+    same product and keeps the best shift per reference.
+    """
+    FORMAT_VERSION = 1
+    METRICS = ("cosine", "correlation")
+    
+    def __init__(self, matrix, names, two_theta_min=10.0, two_theta_max=90.0, step=0.05, fwhm=0.25,
+                 fingerprint=None, min_scan_points=50, block_rows=8192):
+        self.matrix = matrix
+        self.names = names
+        self.two_theta_min = two_theta_min
+        self.two_theta_max = two_theta_max
+        self.step = step
+        self.fwhm = fwhm
+        self.fingerprint = fingerprint
+        self.min_scan_points = min_scan_points
+        self.block_rows = block_rows
+        self.grid = two_theta_min + step * np.arange(matrix.shape[1])
+        # Per-row mean and centred norm turn the cosine product into a Pearson correlation
+        self.means = np.empty(len(names))
+        for start in range(0, len(names), block_rows):
+            self.means[start:start + block_rows] = matrix[start:start + block_rows].mean(axis=1)
+        self.spreads = np.sqrt(np.clip(1 - matrix.shape[1] * self.means ** 2, 1e-12, None))
+    
+    def __len__(self):
+        return len(self.names)
+    
+    @staticmethod
+    def grid_size(two_theta_min, two_theta_max, step):
+        return int(round((two_theta_max - two_theta_min) / step)) + 1
+    
+    @classmethod
+    def build(cls, references, path=None, two_theta_min=10.0, two_theta_max=90.0, step=0.05, fwhm=0.25,
+              fingerprint=None, chunk_size=4096):
+        """Index ``references`` ((phase, two_theta, intensity) tuples).
+        
+        With ``path`` the matrix is rendered chunk by chunk straight into the
+        persisted file and the memory-mapped index is returned.
+        """
+        references = list(references)
+        shape = (len(references), cls.grid_size(two_theta_min, two_theta_max, step))
+        if path is not None:
+            path = Path(path)
+            path.mkdir(parents=True, exist_ok=True)
+            matrix = np.lib.format.open_memmap(path / "patterns.tmp.npy", mode="w+", dtype=np.float32,
+                                               shape=shape)
+        else:
+            matrix = np.empty(shape, dtype=np.float32)
+        for start in range(0, shape[0], chunk_size):
+            chunk = references[start:start + chunk_size]
+            matrix[start:start + len(chunk)] = cls._render_sticks(
+                [two_theta for _, two_theta, _ in chunk], [intensity for _, _, intensity in chunk],
+                two_theta_min, step, shape[1], fwhm)
+        names = [name for name, _, _ in references]
+        if path is None:
+            return cls(matrix, names, two_theta_min, two_theta_max, step, fwhm, fingerprint)
+        matrix.flush()
+        del matrix
+        os.replace(path / "patterns.tmp.npy", path / "patterns.npy")
+        cls._write_meta(path, names, two_theta_min, two_theta_max, step, fwhm, fingerprint)
+        return cls.load(path)
+    
+    @classmethod
+    def _render_sticks(cls, two_thetas, intensities, two_theta_min, step, n_bins, fwhm):
+        """Gaussian-broadened, L2-normalized rows for a batch of peak lists"""
+        rows = np.repeat(np.arange(len(two_thetas)), [len(t) for t in two_thetas])
+        position = (np.concatenate(two_thetas) - two_theta_min) / step if len(rows) else np.empty(0)
+        height = np.concatenate(intensities).astype(np.float64) if len(rows) else np.empty(0)
+        # Each peak's profile is evaluated on the bins within 4 sigma of its centre
+        sigma = fwhm / step / (2 * np.sqrt(2 * np.log(2)))
+        half = max(1, int(np.ceil(4 * sigma)))
+        bins = np.floor(position).astype(np.int64)[:, None] + np.arange(-half, half + 2)
+        weight = height[:, None] * np.exp(-0.5 * ((bins - position[:, None]) / sigma) ** 2)
+        inside = (bins >= 0) & (bins < n_bins)
+        flat = (rows[:, None] * n_bins + bins)[inside]
+        profiles = np.bincount(flat, weight[inside], minlength=len(two_thetas) * n_bins)
+        return cls._normalize(profiles.reshape(-1, n_bins))
+    
+    @staticmethod
+    def _normalize(rows):
+        norms = np.linalg.norm(rows, axis=1, keepdims=True)
+        return (rows / np.where(norms > 0, norms, 1)).astype(np.float32)
+    
+    @staticmethod
+    def _write_meta(path, names, two_theta_min, two_theta_max, step, fwhm, fingerprint):
+        meta = {"version": PhaseIndex.FORMAT_VERSION, "fingerprint": fingerprint, "names": names,
+                "two_theta_min": two_theta_min, "two_theta_max": two_theta_max, "step": step, "fwhm": fwhm}
+        tmp_path = path / "meta.json.tmp"
+        with open(tmp_path, "w") as handle:
+            json.dump(meta, handle)
+        os.replace(tmp_path, path / "meta.json")
+    
+    def save(self, path):
+        path = Path(path)
+        path.mkdir(parents=True, exist_ok=True)
+        np.save(path / "patterns.tmp.npy", np.asarray(self.matrix, dtype=np.float32))
+        os.replace(path / "patterns.tmp.npy", path / "patterns.npy")
+        self._write_meta(path, self.names, self.two_theta_min, self.two_theta_max, self.step, self.fwhm,
+                         self.fingerprint)
+    
+    @classmethod
+    def load(cls, path):
+        path = Path(path)
+        with open(path / "meta.json") as handle:
+            meta = json.load(handle)
+        matrix = np.load(path / "patterns.npy", mmap_mode="r")
+        return cls(matrix, meta["names"], meta["two_theta_min"], meta["two_theta_max"], meta["step"],
+                   meta["fwhm"], meta["fingerprint"])
+    
+    @classmethod
+    def load_or_build(cls, load_references, path, fingerprint, **build_options):
+        """Reuse the persisted index when its library fingerprint still matches"""
+        path = Path(path)
+        if (path / "meta.json").exists() and (path / "patterns.npy").exists():
+            with open(path / "meta.json") as handle:
+                meta = json.load(handle)
+            if meta.get("version") == cls.FORMAT_VERSION and meta.get("fingerprint") == fingerprint:
+                return cls.load(path)
+        return cls.build(load_references(), path=path, fingerprint=fingerprint, **build_options)
+    
+    def vectorize(self, two_theta, intensity):
+        """Project one pattern onto the index grid as a unit vector.
+        
+        Short inputs (fewer than ``min_scan_points``) are peak lists and are
+        broadened like the references; longer ones are continuous scans,
+        interpolated onto the grid after removing a constant background.
+        """
+        two_theta = np.asarray(two_theta, dtype=np.float64)
+        intensity = np.asarray(intensity, dtype=np.float64)
+        if len(two_theta) < self.min_scan_points:
+            return self._render_sticks([two_theta], [intensity], self.two_theta_min, self.step,
+                                       len(self.grid), self.fwhm)[0]
+        order = np.argsort(two_theta, kind="stable")
+        two_theta, intensity = two_theta[order], intensity[order]
+        profile = np.interp(self.grid, two_theta, intensity - np.percentile(intensity, 5), left=0, right=0)
+        return self._normalize(np.clip(profile, 0, None)[None, :])[0]
+    
+    def search(self, two_theta, intensity, k=5, max_shift=0.0, metric="cosine"):
+        """Top-``k`` candidate phases for one pattern"""
+        return self.search_batch([(two_theta, intensity)], k=k, max_shift=max_shift, metric=metric)[0]
+    
+    def search_batch(self, patterns, k=5, max_shift=0.0, metric="cosine"):
+        """Top-``k`` candidates for each (two_theta, intensity) pattern.
+        
+        ``max_shift`` (degrees) tolerates a rigid 2θ offset such as strain,
+        doping or sample displacement; the reported ``offset`` is the sample
+        position minus the reference position.
+        """
+        if metric not in self.METRICS:
+            raise ValueError(f"metric must be one of {self.METRICS}, got {metric!r}")
+        queries = np.stack([self.vectorize(two_theta, intensity) for two_theta, intensity in patterns])
+        n_queries, n_bins = queries.shape
+        max_bins = int(round(max_shift / self.step))
+        offsets = np.arange(-max_bins, max_bins + 1)
+        
+        # Row (q, s) holds query q moved by offsets[s] bins toward higher 2θ
+        shifted = np.zeros((n_queries, len(offsets), n_bins), dtype=np.float32)
+        for s, offset in enumerate(offsets):
+            if offset >= 0:
+                shifted[:, s, offset:] = queries[:, :n_bins - offset]
+            else:
+                shifted[:, s, :offset] = queries[:, -offset:]
+        shifted = shifted.reshape(-1, n_bins)
+        if metric == "correlation":
+            query_means = shifted.mean(axis=1, dtype=np.float64)
+            query_spreads = np.sqrt(np.clip(np.einsum("ij,ij->i", shifted, shifted, dtype=np.float64)
+                                            - n_bins * query_means ** 2, 1e-12, None))
+        
+        best = np.empty((n_queries, len(self.names)), dtype=np.float32)
+        best_shift = np.empty((n_queries, len(self.names)), dtype=np.intp)
+        for start in range(0, len(self.names), self.block_rows):
+            stop = min(start + self.block_rows, len(self.names))
+            scores = shifted @ np.asarray(self.matrix[start:stop]).T
+            if metric == "correlation":
+                scores -= np.outer(n_bins * query_means, self.means[start:stop]).astype(np.float32)
+                scores /= np.outer(query_spreads, self.spreads[start:stop]).astype(np.float32)
+            scores = scores.reshape(n_queries, len(offsets), stop - start)
+            best_shift[:, start:stop] = scores.argmax(axis=1)
+            best[:, start:stop] = np.take_along_axis(scores, best_shift[:, None, start:stop], axis=1)[:, 0]
+        
+        k = min(k, len(self.names))
+        results = []
+        for q in range(n_queries):
+            top = np.argpartition(-best[q], k - 1)[:k] if k < len(self.names) else np.arange(k)
+            top = top[np.argsort(-best[q, top], kind="stable")]
+            results.append([{"phase": self.names[i], "score": float(best[q, i]),
+                             "offset": round(float(-offsets[best_shift[q, i]] * self.step), 6)} for i in top])
+        return results
+
+def load_phase_index(library="dataset/phases", index_dir="dataset/.phase_index", **build_options):
+    """Built-in cards plus any user library, indexed once and memory-mapped afterwards"""
+    library = Path(library)
+    library_files = sorted(library.glob("*.csv")) if library.is_dir() else [library] if library.exists() else []
+    digest = hashlib.sha1(f"v{PhaseIndex.FORMAT_VERSION}".encode("utf-8"))
+    digest.update(json.dumps([REFERENCE_PHASES, sorted(build_options.items())], sort_keys=True).encode("utf-8"))
+    for path in library_files:
+        stat = path.stat()
+        digest.update(f"{path}:{stat.st_size}:{stat.st_mtime_ns}".encode("utf-8"))
+    
+    def load_references():
+        references = builtin_references()
+        for path in library_files:
+            references.extend(read_reference_library(path))
+        return references
+    return PhaseIndex.load_or_build(load_references, index_dir, digest.hexdigest(), **build_options)
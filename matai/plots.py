@@ -0,0 +1,174 @@
+"""Plotly figure builders and the content-addressed figure cache."""
+import hashlib
+import json
+import sys
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+from matai._lazy import LazyModule, is_dataframe
+from matai.xrd import decimate_trace
+
+# Plotly is only imported once a figure is actually built
+go = LazyModule("plotly.graph_objects")
+plotly_subplots = LazyModule("plotly.subplots")
+
+def create_usp_simulation_plot(simulation_data):
+    """Create USP process simulation visualization"""
+    fig = plotly_subplots.make_subplots(
+        rows=2, cols=2,
+        subplot_titles=('Film Thickness Growth', 'Crystallinity Development', 
+                       'Surface Roughness', 'Process Parameters'),
+        specs=[[{"secondary_y": False}, {"secondary_y": False}],
+               [{"secondary_y": False}, {"type": "indicator"}]]
+    )
+    
+    # Thickness plot
+    fig.add_trace(
+        go.Scatter(x=simulation_data["time"], y=simulation_data["thickness"],
+                  mode='lines', name='Thickness (nm)', line=dict(color='cyan', width=3)),
+        row=1, col=1
+    )
+    
+    # Crystallinity plot
+    fig.add_trace(
+        go.Scatter(x=simulation_data["time"], y=simulation_data["crystallinity"],
+                  mode='lines', name='Crystallinity (%)', line=dict(color='magenta', width=3)),
+        row=1, col=2
+    )
+    
+    # Roughness plot
+    fig.add_trace(
+        go.Scatter(x=simulation_data["time"], y=simulation_data["roughness"],
+                  mode='lines', name='Roughness (nm)', line=dict(color='orange', width=3)),
+        row=2, col=1
+    )
+    
+    # Quality indicator
+    fig.add_trace(
+        go.Indicator(
+            mode="gauge+number+delta",
+            value=simulation_data["final_quality"],
+            domain={'x': [0, 1], 'y': [0, 1]},
+            title={'text': "Film Quality Score"},
+            delta={'reference': 80},
+            gauge={'axis': {'range': [None, 100]},
+                   'bar': {'color': "darkblue"},
+                   'steps': [{'range': [0, 50], 'color': "lightgray"},
+                            {'range': [50, 80], 'color': "gray"}],
+                   'threshold': {'line': {'color': "red", 'width': 4},
+                               'thickness': 0.75, 'value': 90}}),
+        row=2, col=2
+    )
+    
+    fig.update_layout(
+        height=600,
+        plot_bgcolor='rgba(0,0,0,0)',
+        paper_bgcolor='rgba(0,0,0,0)',
+        font=dict(color='white', family='Orbitron'),
+        showlegend=False
+    )
+    
+    return fig
+
+XRD_TRACE_COLORS = ['cyan', 'magenta', '#ffd166', '#06d6a0', '#ef476f', '#118ab2', '#f78c6b', '#c77dff']
+
+def create_xrd_comparison_plot(samples, max_points=None):
+    """Overlay diffraction patterns; ``samples`` maps sample name to its 2θ-sorted frame.
+    
+    With ``max_points``, each trace is min/max-decimated to at most that
+    many points, so raw scans stay cheap to serialize and cache.
+    """
+    fig = go.Figure()
+    
+    traces = {}
+    for name, data in samples.items():
+        x, y = data['2Theta'].to_numpy(), data['I'].to_numpy()
+        if max_points is not None and len(x) > max_points:
+            x, y = decimate_trace(x, y, max_points)
+        traces[name] = (x, y)
+    
+    # WebGL traces once the overlay gets large
+    trace_type = go.Scattergl if sum(len(x) for x, _ in traces.values()) > 20_000 else go.Scatter
+    for i, (name, (x, y)) in enumerate(traces.items()):
+        fig.add_trace(trace_type(x=x, y=y,
+                                 mode='lines+markers' if len(x) < 500 else 'lines', name=name,
+                                 line=dict(color=XRD_TRACE_COLORS[i % len(XRD_TRACE_COLORS)],
+                                           width=3 if len(samples) <= 4 else 1.5)))
+    
+    fig.update_layout(
+        title="XRD Diffraction Patterns Comparison",
+        xaxis_title="2θ (degrees)",
+        yaxis_title="Intensity (a.u.)",
+        height=500,
+        plot_bgcolor='rgba(0,0,0,0)',
+        paper_bgcolor='rgba(0,0,0,0)',
+        font=dict(color='white', family='Orbitron')
+    )
+    
+    return fig
+
+FIGURE_THEME = "scifi-dark-v1"  # bump when shared figure styling changes
+
+class FigureCache:
+    """Content-addressed LRU of serialized Plotly figures.
+    
+    Figures are keyed by a hash of their kind, theme and input data, and
+    stored as Plotly JSON under an entry and byte budget. A hit returns the
+    decoded spec dict, skipping figure construction and serialization.
+    """
+    
+    def __init__(self, max_entries=64, max_bytes=32 * 1024 * 1024):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.stats = {"hits": 0, "misses": 0, "evictions": 0}
+    
+    @classmethod
+    def make_key(cls, kind, theme, *inputs):
+        digest = hashlib.sha1(f"{kind}\0{theme}".encode("utf-8"))
+        for value in inputs:
+            cls._digest(digest, value)
+        return digest.hexdigest()
+    
+    @classmethod
+    def _digest(cls, digest, value):
+        if is_dataframe(value):
+            digest.update(repr(list(value.columns)).encode("utf-8"))
+            digest.update(sys.modules["pandas"].util.hash_pandas_object(value, index=False).to_numpy().tobytes())
+        elif isinstance(value, np.ndarray):
+            digest.update(f"{value.dtype}{value.shape}".encode("utf-8"))
+            digest.update(np.ascontiguousarray(value).tobytes())
+        elif isinstance(value, dict):
+            for key in sorted(value):
+                digest.update(f"\0{key}=".encode("utf-8"))
+                cls._digest(digest, value[key])
+        else:
+            digest.update(repr(value).encode("utf-8"))
+    
+    def get_or_build(self, key, builder):
+        with self._lock:
+            spec = self._entries.get(key)
+            if spec is not None:
+                self._entries.move_to_end(key)
+                self.stats["hits"] += 1
+                return json.loads(spec)
+            self.stats["misses"] += 1
+        
+        spec = builder().to_json()
+        with self._lock:
+            if key not in self._entries:
+                self._entries[key] = spec
+                self._bytes += len(spec)
+            while self._entries and (len(self._entries) > self.max_entries or self._bytes > self.max_bytes):
+                _, evicted = self._entries.popitem(last=False)
+                self._bytes -= len(evicted)
+                self.stats["evictions"] += 1
+        return json.loads(spec)
+    
+    def snapshot(self):
+        with self._lock:
+            return {**self.stats, "entries": len(self._entries), "bytes": self._bytes}
@@ -0,0 +1,154 @@
+"""Per-section rerun profiler."""
+import json
+import logging
+import threading
+import time
+import tracemalloc
+from collections import deque
+from contextlib import contextmanager, nullcontext
+
+from matai._lazy import LazyModule
+
+np = LazyModule("numpy")
+
+class RerunProfiler:
+    """Per-section timing (and optional allocation) aggregates for reruns.
+    
+    ``section(name)`` returns a shared no-op context manager while disabled,
+    so instrumented code pays one attribute check. When enabled, each
+    section's wall time is kept in a bounded window for p50/p95 reporting
+    and emitted as a JSON log line on the ``matai.profiler`` logger
+    (``log_to_stderr`` gives that logger a handler when the application has
+    not configured logging itself).
+    Allocation tracking starts ``tracemalloc`` on first use and stops it
+    again once ``enabled`` or ``track_alloc`` is switched off.
+    """
+    _DISABLED = nullcontext()
+    
+    def __init__(self, enabled=False, track_alloc=False, window=500):
+        self._lock = threading.Lock()
+        self._tracing = False
+        self._enabled = enabled
+        self._track_alloc = track_alloc
+        self.window = window
+        self._samples = {}
+        self.logger = logging.getLogger("matai.profiler")
+    
+    def log_to_stderr(self):
+        """Print the JSON section lines to stderr, unless a handler is already configured"""
+        if not self.logger.hasHandlers():
+            handler = logging.StreamHandler()
+            handler.setFormatter(logging.Formatter("%(message)s"))
+            self.logger.addHandler(handler)
+            self.logger.setLevel(logging.INFO)
+        return self
+    
+    @property
+    def enabled(self):
+        return self._enabled
+    
+    @enabled.setter
+    def enabled(self, value):
+        self._enabled = value
+        self._sync_tracing()
+    
+    @property
+    def track_alloc(self):
+        return self._track_alloc
+    
+    @track_alloc.setter
+    def track_alloc(self, value):
+        self._track_alloc = value
+        self._sync_tracing()
+    
+    def _sync_tracing(self):
+        """Stop tracemalloc when allocations are no longer tracked, if this profiler started it"""
+        with self._lock:
+            if self._tracing and not (self._enabled and self._track_alloc):
+                if tracemalloc.is_tracing():
+                    tracemalloc.stop()
+                self._tracing = False
+    
+    def section(self, name):
+        if not self.enabled:
+            return self._DISABLED
+        return self._timed(name)
+    
+    @contextmanager
+    def _timed(self, name):
+        track_alloc = self.track_alloc
+        if track_alloc and not tracemalloc.is_tracing():
+            with self._lock:
+                if not tracemalloc.is_tracing():
+                    tracemalloc.start()
+                    self._tracing = True
+        alloc_before = tracemalloc.get_traced_memory()[0] if track_alloc else 0
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed_ms = (time.perf_counter() - start) * 1000
+            # Tracing may have been switched off mid-section; report no figure rather than a bogus one
+            alloc_kb = None
+            if track_alloc and tracemalloc.is_tracing():
+                alloc_kb = (tracemalloc.get_traced_memory()[0] - alloc_before) / 1024
+            self.record(name, elapsed_ms, alloc_kb)
+    
+    def record(self, name, elapsed_ms, alloc_kb=None):
+        with self._lock:
+            samples = self._samples.get(name)
+            if samples is None:
+                samples = self._samples[name] = deque(maxlen=self.window)
+            samples.append((elapsed_ms, alloc_kb))
+        self.logger.info(json.dumps({"event": "section", "section": name, "ms": round(elapsed_ms, 3),
+                                     "alloc_kb": None if alloc_kb is None else round(alloc_kb, 1)}))
+    
+    def first_item(self, name, items):
+        """Pass ``items`` through, recording the wait for the first one under ``name``.
+        
+        Used for time-to-first-token on streamed answers; the clock starts
+        when iteration starts, not when the generator is created.
+        """
+        if not self.enabled:
+            yield from items
+            return
+        start = time.perf_counter()
+        iterator = iter(items)
+        for item in iterator:
+            self.record(name, (time.perf_counter() - start) * 1000)
+            yield item
+            break
+        yield from iterator
+    
+    def summary(self):
+        """Return per-section count, p50/p95/max latency and mean net allocation"""
+        with self._lock:
+            snapshot = {name: list(samples) for name, samples in self._samples.items()}
+        rows = []
+        for name, samples in sorted(snapshot.items()):
+            times = np.array([ms for ms, _ in samples])
+            allocs = [kb for _, kb in samples if kb is not None]
+            rows.append({
+                "section": name,
+                "count": len(times),
+                "p50_ms": float(np.percentile(times, 50)),
+                "p95_ms": float(np.percentile(times, 95)),
+                "max_ms": float(times.max()),
+                "alloc_kb": float(np.mean(allocs)) if allocs else None
+            })
+        return rows
+    
+    def prometheus_text(self):
+        """Render the summary in the Prometheus text exposition format"""
+        lines = ["# HELP matai_section_seconds Rerun section latency quantiles over the recent window",
+                 "# TYPE matai_section_seconds summary"]
+        for row in self.summary():
+            label = row["section"].replace("\\", "\\\\").replace('"', '\\"')
+            lines.append(f'matai_section_seconds{{section="{label}",quantile="0.5"}} {row["p50_ms"] / 1000:.6f}')
+            lines.append(f'matai_section_seconds{{section="{label}",quantile="0.95"}} {row["p95_ms"] / 1000:.6f}')
+            lines.append(f'matai_section_seconds_count{{section="{label}"}} {row["count"]}')
+        return "\n".join(lines) + "\n"
+    
+    def reset(self):
+        with self._lock:
+            self._samples.clear()
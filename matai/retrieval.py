@@ -0,0 +1,131 @@
+"""Local BM25 retrieval over research passages."""
+import json
+import os
+import re
+import threading
+from pathlib import Path
+
+import numpy as np
+
+class KnowledgeIndex:
+    """BM25 inverted index over local research passages.
+    
+    Postings are stored CSR-style (term offsets into flat passage-id and
+    weight arrays) with the BM25 term weight precomputed per posting, so a
+    query is a single ``np.bincount`` over the postings of its terms.
+    """
+    FORMAT_VERSION = 1
+    TOKEN_PATTERN = re.compile(r"[a-z0-9]+")
+    STOPWORDS = frozenset(
+        "a an and are as at be by can do does for from how i in is it of on or "
+        "that the this to what when which with you your about".split()
+    )
+    
+    def __init__(self, passages, vocab, offsets, postings, weights, fingerprint=None):
+        self.passages = passages
+        self.vocab = vocab
+        self.offsets = offsets
+        self.postings = postings
+        self.weights = weights
+        self.fingerprint = fingerprint
+    
+    @classmethod
+    def tokenize(cls, text):
+        return [token for token in cls.TOKEN_PATTERN.findall(text.lower()) if token not in cls.STOPWORDS]
+    
+    @classmethod
+    def build(cls, documents, k1=1.5, b=0.75, passage_words=120, fingerprint=None):
+        """Index ``documents`` (dicts with ``source`` and ``text``) as passages"""
+        passages = []
+        for document in documents:
+            for paragraph in re.split(r"\n\s*\n", document["text"]):
+                words = paragraph.split()
+                for start in range(0, len(words), passage_words):
+                    chunk = " ".join(words[start:start + passage_words])
+                    if chunk:
+                        passages.append({"source": document["source"], "text": chunk})
+        
+        vocab = {}
+        term_ids, passage_ids = [], []
+        for passage_id, passage in enumerate(passages):
+            for token in cls.tokenize(passage["text"]):
+                term_ids.append(vocab.setdefault(token, len(vocab)))
+                passage_ids.append(passage_id)
+        term_ids = np.asarray(term_ids, dtype=np.int64)
+        passage_ids = np.asarray(passage_ids, dtype=np.int64)
+        n_passages = max(len(passages), 1)
+        
+        # Term frequency per (term, passage) pair, sorted by term
+        keys, tf = np.unique(term_ids * n_passages + passage_ids, return_counts=True)
+        posting_terms, postings = np.divmod(keys, n_passages)
+        offsets = np.zeros(len(vocab) + 1, dtype=np.int64)
+        np.cumsum(np.bincount(posting_terms, minlength=len(vocab)), out=offsets[1:])
+        
+        lengths = np.bincount(passage_ids, minlength=n_passages).astype(np.float64)
+        norm = k1 * (1 - b + b * lengths / max(lengths.mean(), 1.0))
+        df = np.diff(offsets)
+        idf = np.log(1 + (len(passages) - df + 0.5) / (df + 0.5))
+        weights = idf[posting_terms] * tf * (k1 + 1) / (tf + norm[postings])
+        
+        return cls(passages, vocab, offsets, postings.astype(np.int32), weights.astype(np.float32),
+                   fingerprint)
+    
+    def search(self, query, k=5):
+        """Return the top-k passages for ``query`` with their BM25 scores"""
+        term_ids = {self.vocab[token] for token in self.tokenize(query) if token in self.vocab}
+        if not term_ids or not self.passages:
+            return []
+        slices = [slice(self.offsets[t], self.offsets[t + 1]) for t in term_ids]
+        scores = np.bincount(np.concatenate([self.postings[s] for s in slices]),
+                             weights=np.concatenate([self.weights[s] for s in slices]),
+                             minlength=len(self.passages))
+        k = min(k, int(np.count_nonzero(scores)))
+        if k == 0:
+            return []
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return [{**self.passages[i], "score": float(scores[i])} for i in top]
+    
+    def save(self, path):
+        path = Path(path)
+        path.mkdir(parents=True, exist_ok=True)
+        # meta.json carries the fingerprint, so it is dropped first and replaced last: a crash or a
+        # concurrent build never leaves a matching fingerprint next to stale or partial files
+        (path / "meta.json").unlink(missing_ok=True)
+        self._write_atomic(path / "postings.npz", "wb", lambda handle: np.savez(
+            handle, offsets=self.offsets, postings=self.postings, weights=self.weights))
+        self._write_atomic(path / "passages.jsonl", "w", lambda handle: handle.writelines(
+            json.dumps(passage) + "\n" for passage in self.passages))
+        self._write_atomic(path / "meta.json", "w", lambda handle: json.dump(
+            {"fingerprint": self.fingerprint, "vocab": self.vocab}, handle))
+    
+    @staticmethod
+    def _write_atomic(target, mode, write):
+        # Temp names are unique per writer so concurrent builds never share one
+        tmp_path = target.with_name(f"{target.name}.{os.getpid()}-{threading.get_ident()}.tmp")
+        with open(tmp_path, mode) as handle:
+            write(handle)
+        os.replace(tmp_path, target)
+    
+    @classmethod
+    def load(cls, path):
+        path = Path(path)
+        with open(path / "meta.json") as handle:
+            meta = json.load(handle)
+        with open(path / "passages.jsonl") as handle:
+            passages = [json.loads(line) for line in handle]
+        arrays = np.load(path / "postings.npz")
+        return cls(passages, meta["vocab"], arrays["offsets"], arrays["postings"], arrays["weights"],
+                   meta["fingerprint"])
+    
+    @classmethod
+    def load_or_build(cls, load_documents, path, fingerprint):
+        """Reuse the persisted index when its corpus fingerprint still matches"""
+        path = Path(path)
+        if all((path / name).exists() for name in ("meta.json", "passages.jsonl", "postings.npz")):
+            index = cls.load(path)
+            if index.fingerprint == fingerprint:
+                return index
+        index = cls.build(load_documents(), fingerprint=fingerprint)
+        index.save(path)
+        return index
@@ -0,0 +1,718 @@
+"""XRD data loading, raw scan cache, sample index, peak analysis, lattice refinement and trace decimation."""
+import hashlib
+import itertools
+import json
+import os
+import threading
+from collections import OrderedDict
+from pathlib import Path
+
+import numpy as np
+
+from matai._lazy import LazyModule
+
+pd = LazyModule("pandas")
+
+def read_xrd_table(path='dataset/xrd_zno_zno-mg.csv'):
+    """Read the indexed reflection table, falling back to the bundled ZnO / ZnO:Mg data"""
+    try:
+        df = pd.read_csv(path)
+        return df
+    except FileNotFoundError:
+        # Generate sample data if file not found
+        data = {
+            'Sample': ['ZnO']*13 + ['ZnO:Mg']*12,
+            'H': [1,0,1,1,1,1,2,1,2,0,2,1,2] + [1,0,1,1,1,1,2,1,2,0,2,1],
+            'K': [0,0,0,0,1,0,0,1,0,0,0,0,0] + [0,0,0,0,1,0,0,1,0,0,0,0],
+            'L': [0,2,1,2,0,3,0,2,1,4,2,4,3] + [0,2,1,2,0,3,0,2,1,4,2,4],
+            '2Theta': [31.77,34.43,36.27,47.58,56.65,62.93,66.45,68.03,69.17,72.67,77.07,81.51,89.77] + 
+                     [31.84,34.61,36.36,47.72,56.71,63.15,66.51,68.15,69.24,72.99,77.18,81.82],
+            'd_hkl': [2.809,2.599,2.472,1.908,1.622,1.475,1.405,1.376,1.356,1.299,1.236,1.179,1.091] + 
+                    [2.811,2.591,2.471,1.905,1.623,1.472,1.405,1.375,1.356,1.295,1.235,1.177],
+            'I': [267.1,881.4,937.5,250.1,106.5,233.7,52.81,173.9,87.51,60.31,55.08,63.01,76.41] + 
+                [155.9,1140,346.6,136.6,75.88,130.8,69.71,107.1,57.24,78.01,48.85,50.47]
+        }
+        return pd.DataFrame(data)
+
+SCAN_TEXT_SUFFIXES = {".xy", ".txt", ".dat", ".csv"}
+SCAN_BINARY_SUFFIXES = {".npy", ".bin"}
+THETA_COLUMNS = ("2Theta", "2theta", "two_theta", "TwoTheta", "Angle")
+INTENSITY_COLUMNS = ("I", "Intensity", "intensity", "Counts", "counts")
+
+def read_scan_chunks(path, chunk_rows=500_000, binary_dtype="<f4"):
+    """Yield (sample, two_theta, intensity) chunks from one raw scan file"""
+    path = Path(path)
+    suffix = path.suffix.lower()
+    if suffix == ".npy":
+        data = np.load(path, mmap_mode="r")
+        if data.ndim != 2 or 2 not in data.shape:
+            raise ValueError(f"{path}: expected an (N, 2) array, got shape {data.shape}")
+        data = data if data.shape[1] == 2 else data.T
+        for start in range(0, data.shape[0], chunk_rows):
+            block = data[start:start + chunk_rows]
+            yield path.stem, block[:, 0], block[:, 1]
+    elif suffix == ".bin":
+        data = np.memmap(path, dtype=binary_dtype, mode="r").reshape(-1, 2)
+        for start in range(0, data.shape[0], chunk_rows):
+            block = data[start:start + chunk_rows]
+            yield path.stem, block[:, 0], block[:, 1]
+    elif suffix == ".csv":
+        header = pd.read_csv(path, nrows=0).columns
+        theta_col = next((c for c in THETA_COLUMNS if c in header), None)
+        intensity_col = next((c for c in INTENSITY_COLUMNS if c in header), None)
+        if theta_col is None or intensity_col is None:
+            # Headerless two-column export
+            reader = pd.read_csv(path, header=None, usecols=[0, 1], names=["2Theta", "I"],
+                                 comment="#", chunksize=chunk_rows)
+            theta_col, intensity_col = "2Theta", "I"
+        else:
+            usecols = [theta_col, intensity_col] + (["Sample"] if "Sample" in header else [])
+            reader = pd.read_csv(path, usecols=usecols, chunksize=chunk_rows)
+        for chunk in reader:
+            if "Sample" in chunk:
+                for sample, group in chunk.groupby("Sample", sort=False):
+                    yield str(sample), group[theta_col].to_numpy(), group[intensity_col].to_numpy()
+            else:
+                yield path.stem, chunk[theta_col].to_numpy(), chunk[intensity_col].to_numpy()
+    else:
+        reader = pd.read_csv(path, sep=r"\s+", header=None, usecols=[0, 1], names=["2Theta", "I"],
+                             comment="#", chunksize=chunk_rows)
+        for chunk in reader:
+            yield path.stem, chunk["2Theta"].to_numpy(), chunk["I"].to_numpy()
+
+def read_scan_frame(path, chunk_rows=500_000, binary_dtype="<f4"):
+    """Read a whole raw scan file as a long ``Sample``/``2Theta``/``I`` DataFrame"""
+    frames = [pd.DataFrame({"Sample": sample, "2Theta": two_theta, "I": intensity})
+              for sample, two_theta, intensity in read_scan_chunks(path, chunk_rows, binary_dtype)]
+    if not frames:
+        return pd.DataFrame(columns=["Sample", "2Theta", "I"])
+    return pd.concat(frames, ignore_index=True)
+
+class XRDScanStore:
+    """Columnar on-disk cache for continuous XRD scans.
+    
+    Source files (.xy/.txt/.dat, .csv, .npy, raw .bin) are parsed once in
+    chunks and appended to per-sample float64 column files. Reads go through
+    ``np.memmap`` so opening a run touches only the index, and samples are
+    paged in lazily as they are sliced. A sample name already held by
+    another source (``run1/a.xy`` and ``run2/a.xy``) is stored as
+    ``<source path>:<name>`` instead of overwriting it.
+    """
+    TEXT_SUFFIXES = SCAN_TEXT_SUFFIXES
+    BINARY_SUFFIXES = SCAN_BINARY_SUFFIXES
+    
+    def __init__(self, cache_dir="dataset/.xrd_cache", chunk_rows=500_000, binary_dtype="<f4"):
+        self.cache_dir = Path(cache_dir)
+        self.chunk_rows = chunk_rows
+        self.binary_dtype = np.dtype(binary_dtype)
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        self._index_path = self.cache_dir / "index.json"
+        self._lock = threading.RLock()
+        self.index = self._load_index()
+    
+    def _load_index(self):
+        if self._index_path.exists():
+            with open(self._index_path) as handle:
+                return json.load(handle)
+        return {"samples": {}, "sources": {}}
+    
+    def _save_index(self):
+        tmp_path = self._index_path.with_suffix(".tmp")
+        with open(tmp_path, "w") as handle:
+            json.dump(self.index, handle, indent=1)
+        os.replace(tmp_path, self._index_path)
+    
+    @property
+    def samples(self):
+        return list(self.index["samples"])
+    
+    def ingest_directory(self, directory, pattern="*"):
+        """Ingest every supported scan file in ``directory``"""
+        suffixes = self.TEXT_SUFFIXES | self.BINARY_SUFFIXES
+        paths = sorted(p for p in Path(directory).glob(pattern) if p.suffix.lower() in suffixes)
+        return self.ingest(paths)
+    
+    def ingest(self, paths):
+        """Convert source files into the cache, skipping unchanged ones"""
+        with self._lock:
+            return self._ingest(paths)
+    
+    def _ingest(self, paths):
+        ingested = []
+        for path in map(Path, paths):
+            source_key = str(path.resolve())
+            stat = path.stat()
+            fingerprint = {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns}
+            known = self.index["sources"].get(source_key)
+            if known and known["fingerprint"] == fingerprint:
+                ingested.extend(known["samples"])
+                continue
+            
+            writers = {}
+            names = {}
+            try:
+                for sample, two_theta, intensity in self._read_chunks(path):
+                    if sample not in names:
+                        names[sample] = self._stored_name(sample, path, source_key)
+                        writers[names[sample]] = self._open_writers(names[sample])
+                    two_theta_file, intensity_file = writers[names[sample]]
+                    two_theta_file.write(np.ascontiguousarray(two_theta, dtype="<f8").tobytes())
+                    intensity_file.write(np.ascontiguousarray(intensity, dtype="<f8").tobytes())
+            finally:
+                for two_theta_file, intensity_file in writers.values():
+                    two_theta_file.close()
+                    intensity_file.close()
+            
+            # Samples a changed source no longer contains are dropped with their columns
+            for stale in set(known["samples"] if known else []) - set(writers):
+                if self.index["samples"].get(stale, {}).get("source_key") == source_key:
+                    del self.index["samples"][stale]
+                    for column in ("2theta", "I"):
+                        self._column_path(stale, column).unlink(missing_ok=True)
+            for sample in writers:
+                two_theta = self._column(sample, "2theta")
+                self.index["samples"][sample] = {
+                    "id": self._sample_id(sample),
+                    "n_points": int(two_theta.shape[0]),
+                    "two_theta_range": [float(two_theta.min()), float(two_theta.max())],
+                    "sorted": bool(np.all(two_theta[1:] >= two_theta[:-1])),
+                    "source": str(path),
+                    "source_key": source_key
+                }
+            self.index["sources"][source_key] = {
+                "fingerprint": fingerprint,
+                "samples": list(writers)
+            }
+            self._save_index()
+            ingested.extend(writers)
+        return ingested
+    
+    def _stored_name(self, sample, path, source_key):
+        """``sample``, qualified with its source path when another source already holds that name"""
+        entry = self.index["samples"].get(sample)
+        if entry is None:
+            return sample
+        owner = entry.get("source_key") or str(Path(entry["source"]).resolve())
+        return sample if owner == source_key else f"{path.as_posix()}:{sample}"
+    
+    def _read_chunks(self, path):
+        return read_scan_chunks(path, self.chunk_rows, self.binary_dtype)
+    
+    def _sample_id(self, sample):
+        return hashlib.sha1(sample.encode("utf-8")).hexdigest()[:16]
+    
+    def _column_path(self, sample, column):
+        return self.cache_dir / f"{self._sample_id(sample)}.{column}.f8"
+    
+    def _open_writers(self, sample):
+        return (open(self._column_path(sample, "2theta"), "wb"),
+                open(self._column_path(sample, "I"), "wb"))
+    
+    def _column(self, sample, column):
+        path = self._column_path(sample, column)
+        if path.stat().st_size == 0:
+            return np.empty(0, dtype="<f8")
+        return np.memmap(path, dtype="<f8", mode="r")
+    
+    def scan(self, sample):
+        """Return memory-mapped (two_theta, intensity) arrays for one sample"""
+        if sample not in self.index["samples"]:
+            raise KeyError(f"Unknown sample: {sample}")
+        return self._column(sample, "2theta"), self._column(sample, "I")
+    
+    def query(self, sample, two_theta_min=None, two_theta_max=None):
+        """Return the full-resolution slice of one sample inside a 2θ window"""
+        two_theta, intensity = self.scan(sample)
+        low = -np.inf if two_theta_min is None else two_theta_min
+        high = np.inf if two_theta_max is None else two_theta_max
+        if self.index["samples"][sample].get("sorted", False):
+            start = np.searchsorted(two_theta, low, side="left")
+            stop = np.searchsorted(two_theta, high, side="right")
+            return two_theta[start:stop], intensity[start:stop]
+        mask = (two_theta >= low) & (two_theta <= high)
+        return two_theta[mask], intensity[mask]
+    
+    def iter_chunks(self, sample, chunk_points=None):
+        """Yield (two_theta, intensity) slices of one sample without loading it whole"""
+        chunk_points = chunk_points or self.chunk_rows
+        two_theta, intensity = self.scan(sample)
+        for start in range(0, two_theta.shape[0], chunk_points):
+            yield two_theta[start:start + chunk_points], intensity[start:start + chunk_points]
+    
+    def to_frame(self, samples=None):
+        """Materialize selected samples as a long ``Sample``/``2Theta``/``I`` DataFrame"""
+        frames = []
+        for sample in samples or self.samples:
+            two_theta, intensity = self.scan(sample)
+            frames.append(pd.DataFrame({"Sample": sample, "2Theta": np.asarray(two_theta),
+                                        "I": np.asarray(intensity)}))
+        if not frames:
+            return pd.DataFrame(columns=["Sample", "2Theta", "I"])
+        return pd.concat(frames, ignore_index=True)
+
+class XRDSampleIndex:
+    """Per-sample index over long ``Sample``/``2Theta``/``I`` tables.
+    
+    Each sample is stored once as its own 2θ-sorted frame, so selecting an
+    arbitrary subset is a dictionary lookup rather than a boolean mask over
+    the whole table. Per-sample aggregates (points, max intensity, dominant
+    reflection, peak count) are computed when a sample is added and kept
+    in a table; ``add`` only touches the samples it is given. ``revision``
+    changes whenever a sample's data does and is unique across indexes,
+    which makes it a cheap cache key.
+    
+    An index built with ``base`` is an overlay: lookups fall through to the
+    base for samples it does not hold, while ``add`` and ``remove`` only
+    change the overlay. This keeps one session's samples out of a shared
+    index.
+    """
+    _revision_counter = itertools.count(1)
+    
+    def __init__(self, df=None, analyzer=None, base=None):
+        self.base = base
+        if analyzer is None:
+            analyzer = base.analyzer if base is not None else XRDAnalyzer()
+        self.analyzer = analyzer
+        self._frames = {}
+        self._aggregates = {}
+        self._revisions = {}
+        self._table = None
+        self._lock = threading.Lock()
+        if df is not None:
+            self.add(df)
+    
+    @property
+    def samples(self):
+        if self.base is None:
+            return list(self._frames)
+        return self.base.samples + [sample for sample in self._frames if sample not in self.base]
+    
+    def __contains__(self, sample):
+        return sample in self._frames or (self.base is not None and sample in self.base)
+    
+    def __len__(self):
+        return len(self.samples) if self.base is not None else len(self._frames)
+    
+    def revision(self, sample):
+        if sample not in self._frames and self.base is not None:
+            return self.base.revision(sample)
+        return self._revisions[sample]
+    
+    def add(self, df):
+        """Add or replace the samples present in ``df``; returns their names"""
+        if df.empty:
+            return []
+        groups = {sample: group.sort_values("2Theta", kind="stable").reset_index(drop=True)
+                  for sample, group in df.groupby("Sample", sort=False, observed=True)}
+        peak_counts = self.analyzer.analyze(df).groupby("Sample", sort=False).size()
+        aggregates = {sample: self._aggregate(sample, group, int(peak_counts.get(sample, 0)))
+                      for sample, group in groups.items()}
+        with self._lock:
+            for sample, group in groups.items():
+                self._frames[sample] = group
+                self._aggregates[sample] = aggregates[sample]
+                self._revisions[sample] = next(self._revision_counter)
+            self._table = None
+        return list(groups)
+    
+    def remove(self, sample):
+        with self._lock:
+            del self._frames[sample]
+            del self._aggregates[sample]
+            self._table = None
+    
+    @staticmethod
+    def _aggregate(sample, group, peaks):
+        intensity = group["I"].to_numpy(dtype=np.float64)
+        strongest = int(np.argmax(intensity))
+        row = {
+            "Sample": sample,
+            "points": len(group),
+            "max_I": float(intensity[strongest]),
+            "dominant_2theta": float(group["2Theta"].iat[strongest]),
+            "dominant_hkl": None,
+            "peaks": peaks
+        }
+        if {"H", "K", "L"} <= set(group.columns):
+            row["dominant_hkl"] = "({}{}{})".format(*(int(group[c].iat[strongest]) for c in ("H", "K", "L")))
+        return row
+    
+    def aggregates(self, samples=None):
+        """Per-sample aggregate table, optionally restricted to ``samples`` (in that order)"""
+        with self._lock:
+            if self._table is None:
+                self._table = pd.DataFrame(list(self._aggregates.values()),
+                                           columns=["Sample", "points", "max_I", "dominant_2theta",
+                                                    "dominant_hkl", "peaks"]).set_index("Sample")
+            table = self._table
+        if self.base is not None:
+            base_table = self.base.aggregates()
+            if len(table):
+                table = pd.concat([base_table.drop(index=table.index, errors="ignore"), table]).loc[self.samples]
+            else:
+                table = base_table
+        return table if samples is None else table.loc[list(samples)]
+    
+    def frame(self, sample):
+        if sample not in self._frames and self.base is not None:
+            return self.base.frame(sample)
+        return self._frames[sample]
+    
+    def select(self, samples):
+        """Long DataFrame holding only ``samples``, in the order given"""
+        frames = [self.frame(sample) for sample in samples]
+        if not frames:
+            return pd.DataFrame(columns=["Sample", "2Theta", "I"])
+        return pd.concat(frames, ignore_index=True)
+
+class XRDAnalyzer:
+    """Batch peak detection, FWHM fitting and Scherrer crystallite sizing.
+    
+    All samples of a long ``Sample``/``2Theta``/``I`` DataFrame are laid out
+    in one NaN-separated array so peak picking and half-maximum searches run
+    as a single vectorized pass. Samples with fewer than ``min_scan_points``
+    rows are treated as already-indexed reflection lists (like the bundled
+    dataset): every row is a peak and FWHM is read from an optional ``FWHM``
+    column. Results are cached per sample content hash.
+    """
+    WAVELENGTH = 1.5406  # Cu K-alpha, Angstrom
+    
+    def __init__(self, wavelength=WAVELENGTH, shape_factor=0.9, instrument_fwhm=0.0,
+                 min_distance=5, min_rel_height=0.05, max_half_width=200,
+                 min_scan_points=50, cache_size=1024):
+        self.wavelength = wavelength
+        self.shape_factor = shape_factor
+        self.instrument_fwhm = instrument_fwhm
+        self.min_distance = min_distance
+        self.min_rel_height = min_rel_height
+        self.max_half_width = max_half_width
+        self.min_scan_points = min_scan_points
+        self.cache_size = cache_size
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+    
+    def analyze(self, df):
+        """Return one row per detected peak across every sample in ``df``"""
+        results = {}
+        pending = []
+        for sample, group in df.groupby("Sample", sort=False):
+            key = self._content_hash(group)
+            with self._lock:
+                cached = self._cache.get(key)
+                if cached is not None:
+                    self._cache.move_to_end(key)
+            if cached is not None:
+                # The key is content only, so an identical scan may have been cached under another name
+                results[sample] = cached.assign(Sample=sample)
+            else:
+                pending.append((sample, key, group.sort_values("2Theta")))
+        
+        sparse = [item for item in pending if len(item[2]) < self.min_scan_points]
+        dense = [item for item in pending if len(item[2]) >= self.min_scan_points]
+        computed = {**self._analyze_reflections(sparse), **self._analyze_scans(dense)}
+        
+        with self._lock:
+            for sample, key, _ in pending:
+                results[sample] = computed[sample]
+                self._cache[key] = computed[sample]
+                if len(self._cache) > self.cache_size:
+                    self._cache.popitem(last=False)
+        
+        frames = [results[sample] for sample in df["Sample"].unique()]
+        return pd.concat(frames, ignore_index=True) if frames else self._empty_result()
+    
+    def summarize(self, peaks):
+        """Aggregate per-sample peak count, strongest reflection and mean crystallite size"""
+        strongest = peaks.loc[peaks.groupby("Sample", sort=False)["I"].idxmax()]
+        summary = peaks.groupby("Sample", sort=False).agg(
+            peaks=("2Theta", "size"),
+            mean_size_nm=("crystallite_size_nm", "mean")
+        )
+        summary["strongest_2theta"] = strongest.set_index("Sample")["2Theta"]
+        return summary.reset_index()
+    
+    def _content_hash(self, group):
+        digest = hashlib.sha1()
+        for column in ("2Theta", "I", "FWHM"):
+            if column in group:
+                digest.update(np.ascontiguousarray(group[column].to_numpy(dtype=np.float64)).tobytes())
+        digest.update(repr((self.wavelength, self.shape_factor, self.instrument_fwhm, self.min_distance,
+                            self.min_rel_height, self.max_half_width, self.min_scan_points)).encode())
+        return digest.hexdigest()
+    
+    def _analyze_reflections(self, items):
+        if not items:
+            return {}
+        table = pd.concat([group for _, _, group in items], ignore_index=True)
+        fwhm = table["FWHM"].to_numpy(dtype=np.float64) if "FWHM" in table else np.full(len(table), np.nan)
+        peaks = self._derive(table["Sample"].to_numpy(), table["2Theta"].to_numpy(dtype=np.float64),
+                             table["I"].to_numpy(dtype=np.float64), fwhm)
+        for column in ("H", "K", "L"):
+            if column in table:
+                peaks[column] = table[column].to_numpy()
+        return {sample: frame.reset_index(drop=True)
+                for sample, frame in peaks.groupby("Sample", sort=False)}
+    
+    def _analyze_scans(self, items):
+        if not items:
+            return {}
+        pad = max(self.min_distance, self.max_half_width) + 1
+        lengths = np.array([len(group) for _, _, group in items])
+        starts = np.concatenate([[0], np.cumsum(lengths + pad)[:-1]]) + pad
+        size = int(starts[-1] + lengths[-1] + pad)
+        
+        # NaN gaps keep windows from crossing sample boundaries
+        x = np.full(size, np.nan)
+        y = np.full(size, np.nan)
+        owner = np.full(size, -1)
+        for i, ((_, _, group), start) in enumerate(zip(items, starts)):
+            x[start:start + lengths[i]] = group["2Theta"].to_numpy(dtype=np.float64)
+            y[start:start + lengths[i]] = group["I"].to_numpy(dtype=np.float64)
+            owner[start:start + lengths[i]] = i
+        
+        # Missing readings (NaN) are skipped rather than poisoning the sample's baseline
+        valid = (owner >= 0) & np.isfinite(x) & np.isfinite(y)
+        baseline = np.minimum.reduceat(np.where(valid, y, np.inf), starts)
+        ceiling = np.maximum.reduceat(np.where(valid, y, -np.inf), starts)
+        
+        # Peaks are local maxima within +/- min_distance above a relative height
+        filled = np.where(valid, y, -np.inf)
+        window = np.lib.stride_tricks.sliding_window_view(filled, 2 * self.min_distance + 1)
+        local_max = np.full(size, -np.inf)
+        local_max[self.min_distance:size - self.min_distance] = window.max(axis=1)
+        threshold = np.full(size, np.inf)
+        with np.errstate(invalid="ignore"):  # samples without a single valid reading
+            threshold[valid] = (baseline + self.min_rel_height * (ceiling - baseline))[owner[valid]]
+        rising = np.r_[False, filled[1:] > filled[:-1]]
+        peak_idx = np.flatnonzero(valid & (filled == local_max) & rising & (filled >= threshold))
+        
+        # Half-maximum crossings searched in fixed windows on each side
+        half = baseline[owner[peak_idx]] + (y[peak_idx] - baseline[owner[peak_idx]]) / 2
+        offsets = np.arange(1, self.max_half_width + 1)
+        left = self._half_crossing(x, y, peak_idx, half, peak_idx[:, None] - offsets[None, :], +1)
+        right = self._half_crossing(x, y, peak_idx, half, peak_idx[:, None] + offsets[None, :], -1)
+        fwhm = right - left
+        
+        names = np.array([sample for sample, _, _ in items], dtype=object)
+        peaks = self._derive(names[owner[peak_idx]], x[peak_idx], y[peak_idx], fwhm)
+        computed = {sample: frame.reset_index(drop=True)
+                    for sample, frame in peaks.groupby("Sample", sort=False)}
+        return {sample: computed.get(sample, self._empty_result()) for sample in names}
+    
+    @staticmethod
+    def _half_crossing(x, y, peak_idx, half, idx, toward_peak):
+        """Interpolate the 2-theta where intensity first drops below ``half``"""
+        below = y[idx] < half[:, None]
+        found = below.any(axis=1)
+        first = below.argmax(axis=1)
+        rows = np.arange(len(peak_idx))
+        outer = idx[rows, first]
+        inner = outer + toward_peak
+        x0, x1, y0, y1 = x[outer], x[inner], y[outer], y[inner]
+        with np.errstate(divide="ignore", invalid="ignore"):
+            crossing = x0 + (half - y0) * (x1 - x0) / (y1 - y0)
+        return np.where(found, crossing, np.nan)
+    
+    def _derive(self, samples, two_theta, intensity, fwhm):
+        theta = np.radians(two_theta / 2)
+        beta = np.radians(np.sqrt(np.clip(fwhm ** 2 - self.instrument_fwhm ** 2, 0, None)))
+        with np.errstate(divide="ignore", invalid="ignore"):
+            size_nm = np.where(beta > 0, self.shape_factor * self.wavelength / (beta * np.cos(theta)) / 10, np.nan)
+        return pd.DataFrame({
+            "Sample": samples,
+            "2Theta": two_theta,
+            "I": intensity,
+            "FWHM": fwhm,
+            "d_spacing": self.wavelength / (2 * np.sin(theta)),
+            "crystallite_size_nm": size_nm
+        })
+    
+    def _empty_result(self):
+        return pd.DataFrame(columns=["Sample", "2Theta", "I", "FWHM", "d_spacing", "crystallite_size_nm"])
+
+class LatticeRefiner:
+    """Batched least-squares lattice parameters from indexed reflections.
+    
+    For each crystal system 1/d² is linear in the reciprocal metric terms
+    (1/a², 1/b², 1/c²) with coefficients from (h, k, l). The normal
+    equations of every sample in a long ``Sample``/``H``/``K``/``L``/``2Theta``
+    table are accumulated with ``np.bincount`` and solved in one stacked
+    ``np.linalg.solve``. A ``d_hkl`` column, when present, is checked
+    against Bragg's law, and strain is reported against a reference cell.
+    """
+    SYSTEMS = {
+        "cubic": ("a",),
+        "tetragonal": ("a", "c"),
+        "hexagonal": ("a", "c"),
+        "orthorhombic": ("a", "b", "c")
+    }
+    # ZnO wurtzite, JCPDS 36-1451
+    REFERENCE_CELLS = {"hexagonal": {"a": 3.2498, "c": 5.2066}}
+    
+    def __init__(self, system="hexagonal", wavelength=XRDAnalyzer.WAVELENGTH, reference=None,
+                 bragg_tolerance=2e-3):
+        if system not in self.SYSTEMS:
+            raise ValueError(f"system must be one of {sorted(self.SYSTEMS)}, got {system!r}")
+        self.system = system
+        self.wavelength = wavelength
+        self.reference = reference if reference is not None else self.REFERENCE_CELLS.get(system, {})
+        self.bragg_tolerance = bragg_tolerance
+    
+    @property
+    def parameters(self):
+        return self.SYSTEMS[self.system]
+    
+    def design(self, h, k, l):
+        """Coefficients of 1/d² in the reciprocal metric terms, one row per reflection"""
+        h, k, l = (np.asarray(v, dtype=np.float64) for v in (h, k, l))
+        columns = {
+            "cubic": [h ** 2 + k ** 2 + l ** 2],
+            "tetragonal": [h ** 2 + k ** 2, l ** 2],
+            "hexagonal": [4 / 3 * (h ** 2 + h * k + k ** 2), l ** 2],
+            "orthorhombic": [h ** 2, k ** 2, l ** 2]
+        }[self.system]
+        return np.stack(columns, axis=1)
+    
+    def bragg_d(self, two_theta):
+        return self.wavelength / (2 * np.sin(np.radians(np.asarray(two_theta, dtype=np.float64) / 2)))
+    
+    def refine(self, df, source="2theta"):
+        """Refine every sample in ``df``; returns ``(lattice, reflections)`` DataFrames.
+        
+        ``source`` selects the observed spacings: Bragg d from ``2Theta``
+        (default) or the tabulated ``d_hkl`` column.
+        """
+        required = {"Sample", "H", "K", "L", "2Theta"} | ({"d_hkl"} if source == "d_hkl" else set())
+        missing = required - set(df.columns)
+        if missing:
+            raise ValueError(f"Lattice refinement needs columns {sorted(missing)}")
+        if source not in ("2theta", "d_hkl"):
+            raise ValueError(f"source must be '2theta' or 'd_hkl', got {source!r}")
+        
+        ids, samples = pd.factorize(df["Sample"], sort=False)
+        n_samples, names = len(samples), self.parameters
+        two_theta = df["2Theta"].to_numpy(dtype=np.float64)
+        d_bragg = self.bragg_d(two_theta)
+        d_obs = d_bragg if source == "2theta" else df["d_hkl"].to_numpy(dtype=np.float64)
+        y = 1 / d_obs ** 2
+        design = self.design(df["H"], df["K"], df["L"])
+        p = design.shape[1]
+        
+        # Stacked normal equations, one (p, p) system per sample
+        normal = np.empty((n_samples, p, p))
+        rhs = np.empty((n_samples, p))
+        for i in range(p):
+            rhs[:, i] = np.bincount(ids, design[:, i] * y, minlength=n_samples)
+            for j in range(i, p):
+                normal[:, i, j] = normal[:, j, i] = np.bincount(ids, design[:, i] * design[:, j],
+                                                                minlength=n_samples)
+        counts = np.bincount(ids, minlength=n_samples)
+        solvable = (counts >= p) & (np.abs(np.linalg.det(normal)) > 1e-12 * np.abs(normal).max(axis=(1, 2)) ** p)
+        metric = np.full((n_samples, p), np.nan)
+        inverse = np.full((n_samples, p, p), np.nan)
+        if solvable.any():
+            inverse[solvable] = np.linalg.inv(normal[solvable])
+            metric[solvable] = np.einsum("sij,sj->si", inverse[solvable], rhs[solvable])
+        
+        predicted = np.einsum("ij,ij->i", design, metric[ids])
+        residual = y - predicted
+        with np.errstate(invalid="ignore", divide="ignore"):
+            d_calc = 1 / np.sqrt(predicted)
+            two_theta_calc = 2 * np.degrees(np.arcsin(self.wavelength / (2 * d_calc)))
+            dof = counts - p
+            variance = np.where(dof > 0, np.bincount(ids, residual ** 2, minlength=n_samples) / dof, np.nan)
+            metric_err = np.sqrt(variance[:, None] * np.diagonal(inverse, axis1=1, axis2=2))
+            cell = 1 / np.sqrt(metric)
+            cell_err = metric_err / (2 * metric ** 1.5)
+        delta_2theta = two_theta - two_theta_calc
+        
+        lattice = pd.DataFrame({"Sample": samples, "system": self.system, "reflections": counts})
+        for i, name in enumerate(names):
+            lattice[name] = cell[:, i]
+            lattice[f"{name}_err"] = cell_err[:, i]
+            lattice[f"strain_{name}"] = cell[:, i] / self.reference[name] - 1 if name in self.reference else np.nan
+        if self.system in ("hexagonal", "tetragonal"):
+            lattice["c_over_a"] = cell[:, 1] / cell[:, 0]
+        a, c = cell[:, 0], cell[:, -1]
+        lattice["volume"] = {
+            "cubic": a ** 3,
+            "tetragonal": a ** 2 * c,
+            "hexagonal": np.sqrt(3) / 2 * a ** 2 * c,
+            "orthorhombic": np.prod(cell, axis=1)
+        }[self.system]
+        lattice["rms_2theta"] = np.where(solvable, np.sqrt(np.bincount(
+            ids, np.nan_to_num(delta_2theta ** 2), minlength=n_samples) / np.maximum(counts, 1)), np.nan)
+        
+        reflections = pd.DataFrame({
+            "Sample": df["Sample"].to_numpy(),
+            "H": df["H"].to_numpy(),
+            "K": df["K"].to_numpy(),
+            "L": df["L"].to_numpy(),
+            "2Theta": two_theta,
+            "2Theta_calc": two_theta_calc,
+            "delta_2theta": delta_2theta,
+            "d_obs": d_obs,
+            "d_calc": d_calc,
+            "residual_inv_d2": residual
+        })
+        if "d_hkl" in df:
+            # Bragg consistency between the tabulated spacing and the measured angle
+            deviation = df["d_hkl"].to_numpy(dtype=np.float64) / d_bragg - 1
+            reflections["bragg_dev"] = deviation
+            worst = np.zeros(n_samples)
+            np.maximum.at(worst, ids, np.abs(deviation))
+            lattice["bragg_max_dev"] = worst
+            lattice["bragg_ok"] = worst <= self.bragg_tolerance
+        return lattice, reflections
+
+def downsample_minmax(x, y, max_points):
+    """Keep the min and max of each bucket so peaks survive decimation; returns at most ``max_points``"""
+    x, y = np.asarray(x), np.asarray(y)
+    n = len(x)
+    if n <= max_points:
+        return x, y
+    if max_points < 4:
+        keep = np.unique(np.linspace(0, n - 1, max(max_points, 1)).astype(int))
+        return x[keep], y[keep]
+    # Both endpoints are kept; the interior [1, n - 1) is split into near-equal buckets
+    n_buckets = (max_points - 2) // 2
+    edges = np.linspace(1, n - 1, n_buckets + 1).astype(int)
+    starts, stops = edges[:-1], edges[1:]
+    idx = starts[:, None] + np.arange(int((stops - starts).max()))
+    inside = idx < stops[:, None]
+    values = y[np.minimum(idx, n - 1)]
+    valid = inside & ~np.isnan(values)
+    lo = idx[np.arange(n_buckets), np.where(valid, values, np.inf).argmin(axis=1)]
+    hi = idx[np.arange(n_buckets), np.where(valid, values, -np.inf).argmax(axis=1)]
+    keep = np.unique(np.concatenate([lo, hi, [0, n - 1]]))
+    return x[keep], y[keep]
+
+def downsample_lttb(x, y, max_points):
+    """Largest-triangle-three-buckets decimation"""
+    x, y = np.asarray(x, dtype=np.float64), np.asarray(y, dtype=np.float64)
+    n = len(x)
+    if n <= max_points or max_points < 3:
+        return x, y
+    edges = np.linspace(1, n - 1, max_points - 1).astype(int)
+    keep = np.empty(max_points, dtype=int)
+    keep[0], keep[-1] = 0, n - 1
+    previous = 0
+    for i in range(max_points - 2):
+        start, stop = edges[i], edges[i + 1]
+        # Average of the next bucket (or the last point) anchors the triangle
+        if i + 2 < len(edges):
+            next_x = x[stop:edges[i + 2]].mean()
+            next_y = y[stop:edges[i + 2]].mean()
+        else:
+            next_x, next_y = x[-1], y[-1]
+        area = np.abs((x[previous] - next_x) * (y[start:stop] - y[previous])
+                      - (x[previous] - x[start:stop]) * (next_y - y[previous]))
+        previous = start + int(np.argmax(area))
+        keep[i + 1] = previous
+    return x[keep], y[keep]
+
+def decimate_trace(x, y, max_points=2000, method="minmax"):
+    """Reduce a trace to at most ``max_points`` before handing it to Plotly"""
+    if method == "lttb":
+        return downsample_lttb(x, y, max_points)
+    return downsample_minmax(x, y, max_points)
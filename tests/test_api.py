@@ -0,0 +1,36 @@
+import pytest
+
+pytest.importorskip("fastapi")
+from fastapi.testclient import TestClient
+
+from matai.api import create_app
+from matai.usp import USPIntegrationError
+
+
+@pytest.fixture
+def client():
+    with TestClient(create_app(workers=1, batch_window=0.001)) as test_client:
+        yield test_client
+
+
+def test_simulate_rejects_out_of_range_params(client):
+    for params in ({"time": 1e6}, {"temperature": 1e5}, {"flow_rate": 0}, {"concentration": 1e-9}):
+        response = client.post("/usp/simulate", json={"params": params})
+        assert response.status_code == 422, params
+
+
+def test_simulate_accepts_params_at_the_limits(client):
+    response = client.post("/usp/simulate", json={"params": {"time": 600, "flow_rate": 0.1,
+                                                             "concentration": 0.005}, "n_points": 5})
+    assert response.status_code == 200
+    assert len(response.json()["thickness"]) == 5
+
+
+def test_integration_failures_are_rejected_input(client):
+    async def fail(func, rows, *args):
+        raise USPIntegrationError("USP integration did not converge within 10 steps")
+    client.app.state.service.call = fail
+    response = client.post("/usp/simulate", json={})
+    assert response.status_code == 422
+    assert "did not converge" in response.json()["detail"]
+    assert client.post("/usp/simulate_batch", json={"param_sets": [{}, {}]}).status_code == 422
@@ -0,0 +1,28 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from matai.batch import BatchRunner, BatchTaskError, analyze_scan_files
+
+
+def test_failing_item_does_not_discard_the_rest_of_the_run(tmp_path):
+    two_theta = np.linspace(20, 60, 2000)
+    intensity = 5 + 100 * np.exp(-((two_theta - 34.4) / 0.2) ** 2)
+    np.savetxt(tmp_path / "good.xy", np.column_stack([two_theta, intensity]))
+    np.save(tmp_path / "bad.npy", np.zeros((3, 3)))
+    tasks = [[str(tmp_path / "bad.npy"), str(tmp_path / "good.xy")], [str(tmp_path / "good.xy")]]
+    runner = BatchRunner(tmp_path / "out", workers=1, log=lambda message: None)
+
+    with pytest.raises(BatchTaskError) as failure:
+        runner.run("xrd", analyze_scan_files, tasks)
+    results = pd.read_csv(failure.value.results_path)
+    assert list(results["File"].str.endswith("good.xy")) == [True, True]
+    errors = pd.read_csv(failure.value.errors_path)
+    assert list(errors["task"]) == [0]
+    assert errors["item"].iat[0].endswith("bad.npy")
+
+    # Resuming retries only the task with failures; once the input is fixed the run completes
+    np.save(tmp_path / "bad.npy", np.column_stack([two_theta, intensity]))
+    results_path = runner.run("xrd", analyze_scan_files, tasks)
+    assert len(pd.read_csv(results_path)) == 3
+    assert not (tmp_path / "out" / "errors.csv").exists()
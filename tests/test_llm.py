@@ -0,0 +1,127 @@
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from matai.llm import ModelClient, ModelClientError
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, *args):
+        pass
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        state = self.server.state
+        with state["lock"]:
+            state["requests"] += 1
+            state["in_flight"] += 1
+            state["max_in_flight"] = max(state["max_in_flight"], state["in_flight"])
+            status = state["statuses"].pop(0) if state["statuses"] else 200
+        try:
+            time.sleep(state["delay"])
+            if status != 200:
+                self._send(status, b"{}")
+            elif state["stream"] is not None:
+                self._stream(state["stream"])
+            else:
+                body = {"choices": [{"message": {"content": "ok"}}]}
+                self._send(200, json.dumps(body).encode())
+        finally:
+            with state["lock"]:
+                state["in_flight"] -= 1
+
+    def _send(self, status, body):
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _stream(self, events):
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        for event in events:
+            if event is None:
+                # Promise a chunk, then drop the connection before sending it
+                self.wfile.write(b"40\r\ndata: {\"cho")
+                self.wfile.flush()
+                self.close_connection = True
+                return
+            chunk = f"{event}\n".encode()
+            self.wfile.write(f"{len(chunk):x}\r\n".encode() + chunk + b"\r\n")
+            self.wfile.flush()
+        self.wfile.write(b"0\r\n\r\n")
+
+
+def delta(text):
+    return "data: " + json.dumps({"choices": [{"delta": {"content": text}}]})
+
+
+@pytest.fixture
+def server():
+    httpd = ThreadingHTTPServer(("127.0.0.1", 0), StubHandler)
+    httpd.daemon_threads = True
+    httpd.state = {"lock": threading.Lock(), "requests": 0, "in_flight": 0, "max_in_flight": 0,
+                   "statuses": [], "delay": 0, "stream": None}
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    yield httpd
+    httpd.shutdown()
+    httpd.server_close()
+
+
+@pytest.fixture
+def client(server):
+    host, port = server.server_address
+    model_client = ModelClient(f"http://{host}:{port}", max_concurrent=2, read_timeout=5,
+                               backoff=0.01, retry_budget=5)
+    yield model_client
+    model_client.close()
+
+
+def test_chat_retries_transient_statuses(server, client):
+    server.state["statuses"] = [503, 503]
+    assert client.chat([{"role": "user", "content": "hi"}]) == "ok"
+    assert server.state["requests"] == 3
+
+
+def test_chat_caps_concurrent_requests(server, client):
+    server.state["delay"] = 0.05
+    threads = [threading.Thread(target=client.chat, args=([],)) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert server.state["requests"] == 8
+    assert server.state["max_in_flight"] == 2
+
+
+def test_stream_chat_parses_sse_events(server, client):
+    server.state["stream"] = [": keep-alive", delta("Zn"), "", "event: message",
+                              'data: {"choices": [{"delta": {}}]}', delta("O"), "data: [DONE]", delta("x")]
+    assert list(client.stream_chat([])) == ["Zn", "O"]
+
+
+def test_stream_chat_reports_malformed_event(server, client):
+    server.state["stream"] = [delta("Zn"), "data: {not json"]
+    chunks = []
+    with pytest.raises(ModelClientError, match="malformed event"):
+        for chunk in client.stream_chat([]):
+            chunks.append(chunk)
+    assert chunks == ["Zn"]
+
+
+def test_stream_chat_reports_dropped_connection(server, client):
+    server.state["stream"] = [delta("Zn"), None]
+    chunks = []
+    with pytest.raises(ModelClientError, match="stream failed"):
+        for chunk in client.stream_chat([]):
+            chunks.append(chunk)
+    assert chunks == ["Zn"]
@@ -0,0 +1,15 @@
+import numpy as np
+import pandas as pd
+
+from matai.plots import create_xrd_comparison_plot
+
+
+def test_comparison_plot_decimates_long_scans():
+    two_theta = np.linspace(10, 90, 200_000)
+    intensity = 5 + 100 * np.exp(-((two_theta - 34.4) / 0.05) ** 2)
+    scan = pd.DataFrame({"2Theta": two_theta, "I": intensity})
+    short = scan.iloc[::1000]
+    fig = create_xrd_comparison_plot({"scan": scan, "short": short}, max_points=2000)
+    assert len(fig.data[0].x) <= 2000
+    assert len(fig.data[1].x) == len(short)
+    assert max(fig.data[0].y) == intensity.max()
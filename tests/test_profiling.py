@@ -0,0 +1,45 @@
+import json
+import tracemalloc
+
+from matai.profiling import RerunProfiler
+
+
+def test_disabling_stops_allocation_tracing():
+    profiler = RerunProfiler(enabled=True, track_alloc=True)
+    with profiler.section("build"):
+        data = [0] * 10_000
+    assert tracemalloc.is_tracing()
+    assert profiler.summary()[0]["alloc_kb"] > 0
+    profiler.enabled = False
+    assert not tracemalloc.is_tracing()
+
+    profiler.enabled = True
+    with profiler.section("build"):
+        data = [0] * 10_000
+    profiler.track_alloc = False
+    assert not tracemalloc.is_tracing()
+    del data
+
+
+def test_leaves_tracing_started_elsewhere_running():
+    tracemalloc.start()
+    try:
+        profiler = RerunProfiler(enabled=True, track_alloc=True)
+        with profiler.section("build"):
+            pass
+        profiler.enabled = False
+        assert tracemalloc.is_tracing()
+    finally:
+        tracemalloc.stop()
+
+
+def test_log_to_stderr_emits_one_json_line_per_section(capsys, monkeypatch):
+    profiler = RerunProfiler(enabled=True)
+    for attribute, value in (("handlers", []), ("propagate", False), ("level", profiler.logger.level)):
+        monkeypatch.setattr(profiler.logger, attribute, value)
+    profiler.log_to_stderr().log_to_stderr()
+    assert len(profiler.logger.handlers) == 1
+    with profiler.section("render"):
+        pass
+    event = json.loads(capsys.readouterr().err)
+    assert (event["event"], event["section"]) == ("section", "render")
@@ -0,0 +1,31 @@
+import pytest
+
+from matai.retrieval import KnowledgeIndex
+
+DOCUMENTS = [{"source": "zno.md", "text": "Zinc oxide films grown by spray pyrolysis."},
+             {"source": "mg.md", "text": "Magnesium doping widens the ZnO band gap."}]
+
+
+def test_load_or_build_reuses_a_matching_index(tmp_path):
+    KnowledgeIndex.load_or_build(lambda: DOCUMENTS, tmp_path, "v1")
+    index = KnowledgeIndex.load_or_build(lambda: pytest.fail("rebuilt"), tmp_path, "v1")
+    assert index.search("band gap")[0]["source"] == "mg.md"
+    assert sorted(p.name for p in tmp_path.iterdir()) == ["meta.json", "passages.jsonl", "postings.npz"]
+
+
+def test_interrupted_save_never_leaves_a_matching_fingerprint(tmp_path, monkeypatch):
+    KnowledgeIndex.load_or_build(lambda: DOCUMENTS, tmp_path, "v1")
+    write_atomic = KnowledgeIndex._write_atomic
+
+    def crash_on_passages(target, mode, write):
+        if target.name == "passages.jsonl":
+            raise OSError("disk full")
+        write_atomic(target, mode, write)
+
+    monkeypatch.setattr(KnowledgeIndex, "_write_atomic", staticmethod(crash_on_passages))
+    with pytest.raises(OSError):
+        KnowledgeIndex.build(DOCUMENTS[:1], fingerprint="v1").save(tmp_path)
+    monkeypatch.undo()
+
+    index = KnowledgeIndex.load_or_build(lambda: DOCUMENTS, tmp_path, "v1")
+    assert len(index.passages) == 2
@@ -0,0 +1,34 @@
+import numpy as np
+
+from matai.xrd import XRDScanStore
+
+
+def write_xy(path, offset):
+    two_theta = np.linspace(20, 80, 50)
+    np.savetxt(path, np.column_stack([two_theta, two_theta + offset]))
+
+
+def test_same_stem_in_different_sources_does_not_overwrite(tmp_path):
+    for run, offset in (("run1", 0), ("run2", 1000)):
+        (tmp_path / run).mkdir()
+        write_xy(tmp_path / run / "a.xy", offset)
+    np.save(tmp_path / "run1" / "a.npy", np.column_stack([np.linspace(20, 80, 7), np.zeros(7)]))
+    store = XRDScanStore(tmp_path / "cache")
+    names = store.ingest_directory(tmp_path, "run*/*")
+    assert len(set(names)) == 3 and "a" in names
+    assert sorted(len(store.scan(name)[0]) for name in names) == [7, 50, 50]
+    assert sorted(float(store.scan(name)[1][0]) for name in names if len(store.scan(name)[0]) == 50) == [20, 1020]
+    # Unchanged sources are skipped and keep resolving to the same names
+    assert store.ingest_directory(tmp_path, "run*/*") == names
+
+
+def test_changed_source_drops_samples_it_no_longer_contains(tmp_path):
+    source = tmp_path / "campaign.csv"
+    source.write_text("Sample,2Theta,I\nA,30,1\nA,31,2\nB,30,5\n")
+    store = XRDScanStore(tmp_path / "cache")
+    assert store.ingest([source]) == ["A", "B"]
+    source.write_text("Sample,2Theta,I\nA,30,1\nA,31,2\nA,32,3\n")
+    assert store.ingest([source]) == ["A"]
+    assert store.samples == ["A"]
+    assert len(store.scan("A")[0]) == 3
+    assert XRDScanStore(tmp_path / "cache").samples == ["A"]
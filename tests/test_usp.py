@@ -0,0 +1,110 @@
+import numpy as np
+import pytest
+
+from matai.usp import USPIntegrationError, USPSimulator
+
+
+def closed_form(params, t):
+    """Growth curves of the original closed-form model, valid at the reference flux"""
+    return {
+        "thickness": 50 * (1 - np.exp(-t / 5)) * (params["temperature"] / 450),
+        "crystallinity": 30 + 40 * (1 - np.exp(-t / 8)) * (params["frequency"] / 1.7),
+        "roughness": 5 + 3 * np.sin(t / 2) * np.exp(-t / 10)
+    }
+
+
+REFERENCE_RUNS = [{}, {"temperature": 420, "frequency": 2.2, "time": 30},
+                  {"temperature": 500, "frequency": 1.0, "time": 5}]
+
+
+@pytest.mark.parametrize("overrides", REFERENCE_RUNS)
+def test_reference_flux_matches_closed_form_curves(overrides):
+    simulator = USPSimulator()
+    params = {**simulator.default_params, **overrides}
+    result = simulator.simulate_deposition(params, n_points=200)
+    np.testing.assert_allclose(result["time"], np.linspace(0, params["time"], 200))
+    for name, expected in closed_form(params, result["time"]).items():
+        np.testing.assert_allclose(result[name], expected, atol=2e-3, err_msg=name)
+
+
+def test_adaptive_steps_follow_closed_form_curves():
+    simulator = USPSimulator()
+    params = {**simulator.default_params, "time": 30}
+    result = simulator.simulate_deposition(params, n_points=None)
+    t = result["time"]
+    assert len(t) == result["steps"] + 1
+    assert t[0] == 0 and t[-1] == pytest.approx(30) and np.all(np.diff(t) > 0)
+    for name, expected in closed_form(params, t).items():
+        np.testing.assert_allclose(result[name], expected, atol=2e-3, err_msg=name)
+
+
+def test_iter_batch_chunks_reassemble_into_simulate_batch():
+    simulator = USPSimulator()
+    params = {"time": [5, 15, 30], "flow_rate": [1, 3, 8], "concentration": [0.05, 0.1, 0.3]}
+    whole = simulator.simulate_batch(params, n_points=250)
+    chunks = list(simulator.iter_batch(params, n_points=250, chunk_points=7))
+    assert all(0 < chunk["time"].shape[1] <= 7 for chunk in chunks)
+    for name in USPSimulator.TRAJECTORIES:
+        np.testing.assert_allclose(np.concatenate([chunk[name] for chunk in chunks], axis=1), whole[name],
+                                   rtol=1e-12)
+
+
+def test_float32_trajectories_match_float64():
+    simulator = USPSimulator()
+    params = {"temperature": [400, 500], "time": [10, 20]}
+    wide = simulator.simulate_batch(params)
+    compact = simulator.simulate_batch(params, dtype=np.float32)
+    for name in USPSimulator.TRAJECTORIES:
+        assert compact[name].dtype == np.float32
+        np.testing.assert_allclose(compact[name], wide[name], rtol=1e-6, atol=1e-5)
+
+
+@pytest.mark.parametrize("params, message", [
+    ({"temperature": [450, np.nan]}, "temperature must be finite"),
+    ({"flow_rate": [3, 0, 2]}, r"flow_rate must be positive, got 0.0 \(row 1\)"),
+    ({"concentration": [-0.1]}, "concentration must be positive"),
+    ({"time": [10, -1]}, "time must not be negative"),
+    ({"time": [10, 20], "flow_rate": [1, 2, 3]}, "mismatched lengths"),
+])
+def test_rejects_parameters_the_model_cannot_integrate(params, message):
+    with pytest.raises(ValueError, match=message):
+        USPSimulator().simulate_batch(params)
+
+
+def test_integration_stops_at_the_step_budget():
+    simulator = USPSimulator()
+    solver = simulator._integrate(simulator._as_columns({"time": [1000]}), 1e-4, 1e-4, {}, max_steps=5)
+    with pytest.raises(USPIntegrationError, match="did not converge within 5 steps"):
+        list(solver)
+
+
+def test_uncertainty_is_independent_of_worker_count():
+    simulator = USPSimulator()
+    serial = simulator.propagate_uncertainty(n_samples=20_000, chunk_size=6_000, seed=7, workers=1)
+    parallel = simulator.propagate_uncertainty(n_samples=20_000, chunk_size=6_000, seed=7, workers=2)
+    serial.pop("wall_time"), parallel.pop("wall_time")
+    assert serial == parallel
+
+
+def test_uncertainty_percentiles_match_a_direct_draw():
+    simulator = USPSimulator()
+    params = {**simulator.default_params, "temperature": 460}
+    result = simulator.propagate_uncertainty(params, n_samples=50_000, chunk_size=12_000, seed=3)
+
+    # Reproduce the joint run's draws: one spawned seed per chunk, parameters in declaration order
+    joint_seeds = np.random.SeedSequence(3).spawn(1 + len(params))[0]
+    sizes = [12_000] * 4 + [2_000]
+    quality = []
+    for size, seed in zip(sizes, joint_seeds.spawn(len(sizes))):
+        rng = np.random.default_rng(seed)
+        columns = {name: np.maximum(rng.normal(value, simulator.param_tolerances[name], size), 0.0)
+                   for name, value in params.items()}
+        quality.append(simulator._calculate_quality_score(columns))
+    quality = np.concatenate(quality)
+
+    assert result["n_samples"] == len(quality)
+    assert result["mean"] == pytest.approx(quality.mean())
+    assert result["std"] == pytest.approx(quality.std())
+    for q in (1, 5, 25, 50, 75, 95, 99):
+        assert result["percentiles"][f"p{q}"] == pytest.approx(np.percentile(quality, q), abs=0.02)
+    assert result["p_below"][80] == pytest.approx(np.mean(quality < 80), abs=1e-3)
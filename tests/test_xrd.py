@@ -0,0 +1,109 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from matai.xrd import LatticeRefiner, XRDAnalyzer, XRDSampleIndex, downsample_minmax, read_xrd_table
+
+
+def test_analyze_relabels_cached_results_for_renamed_samples():
+    analyzer = XRDAnalyzer()
+    zno = read_xrd_table().query("Sample == 'ZnO'")
+    first = analyzer.analyze(zno)
+    renamed = analyzer.analyze(zno.assign(Sample="B"))
+    assert len(renamed) == len(first)
+    assert set(renamed["Sample"]) == {"B"}
+    assert set(analyzer.analyze(zno)["Sample"]) == {"ZnO"}
+
+
+def test_analyze_relabels_cached_scans():
+    two_theta = np.linspace(20, 60, 2000)
+    intensity = 5 + 100 * np.exp(-((two_theta - 34.4) / 0.2) ** 2)
+    scan = pd.DataFrame({"Sample": "A", "2Theta": two_theta, "I": intensity})
+    analyzer = XRDAnalyzer()
+    analyzer.analyze(scan)
+    both = analyzer.analyze(pd.concat([scan, scan.assign(Sample="B")], ignore_index=True))
+    assert list(both["Sample"]) == ["A", "B"]
+
+
+def test_sample_index_counts_peaks_of_samples_matching_cached_content():
+    zno = read_xrd_table().query("Sample == 'ZnO'")
+    index = XRDSampleIndex(zno)
+    index.add(zno.assign(Sample="copy"))
+    aggregates = index.aggregates()
+    assert aggregates.at["copy", "peaks"] == aggregates.at["ZnO", "peaks"] == len(zno)
+
+
+def test_downsample_minmax_respects_max_points_and_keeps_extremes():
+    rng = np.random.default_rng(0)
+    for n, max_points in [(101, 100), (1000, 999), (3001, 2000), (10, 3), (5000, 4)]:
+        x = np.arange(n, dtype=float)
+        y = rng.random(n)
+        y[n // 3] = 10.0
+        y[n // 2] = -10.0
+        kx, ky = downsample_minmax(x, y, max_points)
+        assert len(kx) <= max_points
+        assert np.all(np.diff(kx) > 0)
+        if max_points >= 4:
+            assert {10.0, -10.0} <= set(ky)
+            assert kx[0] == 0 and kx[-1] == n - 1
+
+
+def test_overlay_index_keeps_additions_out_of_the_base():
+    table = read_xrd_table()
+    base = XRDSampleIndex(table)
+    first, second = XRDSampleIndex(base=base), XRDSampleIndex(base=base)
+    zno = table.query("Sample == 'ZnO'")
+    first.add(zno.assign(Sample="upload"))
+    first.add(zno.assign(I=zno["I"] * 2))
+    assert "upload" in first and "upload" not in base and "upload" not in second
+    assert first.samples == base.samples + ["upload"]
+    assert second.samples == base.samples
+    assert first.revision("ZnO") != base.revision("ZnO")
+    assert first.aggregates(["ZnO"]).at["ZnO", "max_I"] == 2 * base.aggregates(["ZnO"]).at["ZnO", "max_I"]
+    assert second.frame("ZnO") is base.frame("ZnO")
+    assert list(first.select(["ZnO", "upload"])["Sample"].unique()) == ["ZnO", "upload"]
+    assert list(first.aggregates().index) == first.samples
+
+
+def test_analyze_skips_missing_intensities():
+    two_theta = np.linspace(20, 60, 6000)
+    intensity = 5 + 100 * np.exp(-((two_theta - 34.4) / 0.2) ** 2) + 60 * np.exp(-((two_theta - 47.5) / 0.2) ** 2)
+    clean = pd.DataFrame({"Sample": "clean", "2Theta": two_theta, "I": intensity})
+    gappy = clean.assign(Sample="gappy")
+    gappy.loc[100, "I"] = np.nan
+    empty = clean.assign(Sample="empty", I=np.nan).iloc[:100]
+    peaks = XRDAnalyzer().analyze(pd.concat([clean, gappy, empty], ignore_index=True))
+    counts = peaks.groupby("Sample").size()
+    assert counts["gappy"] == counts["clean"] == 2
+    assert "empty" not in counts
+
+
+def hexagonal_reflections(sample, a, c, hkls, wavelength=XRDAnalyzer.WAVELENGTH):
+    h, k, l = np.array(hkls, dtype=float).T
+    d = 1 / np.sqrt(4 / 3 * (h ** 2 + h * k + k ** 2) / a ** 2 + l ** 2 / c ** 2)
+    two_theta = 2 * np.degrees(np.arcsin(wavelength / (2 * d)))
+    return pd.DataFrame({"Sample": sample, "H": h, "K": k, "L": l, "2Theta": two_theta, "d_hkl": d})
+
+
+def test_lattice_refinement_recovers_a_synthetic_hexagonal_cell():
+    hkls = [(1, 0, 0), (0, 0, 2), (1, 0, 1), (1, 0, 2), (1, 1, 0), (1, 0, 3), (1, 1, 2)]
+    strained = hexagonal_reflections("strained", 3.262, 5.195, hkls)
+    strained.loc[2, "d_hkl"] *= 1.01  # one tabulated spacing disagrees with its angle
+    table = pd.concat([hexagonal_reflections("ZnO", 3.2498, 5.2066, hkls), strained,
+                       hexagonal_reflections("basal-only", 3.25, 5.2, [(1, 0, 0), (1, 1, 0), (2, 0, 0)])],
+                      ignore_index=True)
+    lattice, reflections = LatticeRefiner("hexagonal").refine(table)
+    lattice = lattice.set_index("Sample")
+
+    assert lattice.at["ZnO", "a"] == pytest.approx(3.2498, abs=1e-9)
+    assert lattice.at["ZnO", "c"] == pytest.approx(5.2066, abs=1e-9)
+    assert lattice.at["ZnO", "strain_a"] == pytest.approx(0, abs=1e-9)
+    assert lattice.at["strained", "a"] == pytest.approx(3.262, abs=1e-9)
+    assert lattice.at["strained", "c_over_a"] == pytest.approx(5.195 / 3.262)
+    assert lattice.at["ZnO", "rms_2theta"] < 1e-9
+    assert np.abs(reflections["delta_2theta"].iloc[:14]).max() < 1e-9
+    assert list(lattice["bragg_ok"]) == [True, False, True]
+
+    # Basal reflections alone (L = 0 throughout) cannot fix c
+    assert lattice.at["basal-only", "reflections"] == 3
+    assert np.isnan(lattice.loc["basal-only", ["a", "c", "volume", "rms_2theta"]].astype(float)).all()